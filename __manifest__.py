@@ -49,6 +49,11 @@
         'views/smartlogger_action.xml',
         'views/smartlogger_additional_actions.xml',
         'views/smartlogger_data_views.xml',
+        'views/smartlogger_rollup_views.xml',
+        'views/smartlogger_device_views.xml',
+        'views/smartlogger_alert_views.xml',
+        'views/smartlogger_sync_job_views.xml',
+        'views/smartlogger_sync_run_views.xml',
         'views/smartlogger_station_views.xml',
         'views/smartlogger_dashboard_views.xml',
         'wizards/sync_data_wizard_views.xml',
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: controllers/main.py
+
+from odoo import http, fields
+from odoo.http import request, Response, content_disposition
+from werkzeug.exceptions import BadRequest
+from datetime import timedelta
+import csv
+import io
+import json
+import logging
+import uuid
+
+_logger = logging.getLogger(__name__)
+
+# Рядків, що отримуються з серверного курсора за один FETCH
+EXPORT_FETCH_SIZE = 5000
+
+# Рядків CSV/NDJSON, що накопичуються перед відправкою клієнту
+EXPORT_FLUSH_ROWS = 1000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class SmartLoggerExportController(http.Controller):
+
+    @http.route('/smartlogger/export/kpi', type='http', auth='user', methods=['GET'])
+    def export_kpi(self, format='csv', bucket='raw', station_ids=None, date_from=None, date_to=None, **kwargs):
+        """Потоковий експорт історії KPI (сирі дані або зведення) у CSV чи NDJSON.
+
+        Приклад: /smartlogger/export/kpi?format=ndjson&bucket=hour&station_ids=1,2&date_from=2024-01-01
+        date_from - включно; date_to у вигляді дати (2024-01-31) включає весь
+        цей день, як фільтри дашборду, а дата з часом - виключна межа.
+        Рядки читаються серверним курсором порціями, тому пам'ять воркера
+        не залежить від обсягу вибірки.
+        """
+        if format not in EXPORT_FORMATS:
+            raise BadRequest("format: csv або ndjson")
+        try:
+            station_list = [int(value) for value in station_ids.split(',') if value.strip()] if station_ids else []
+            date_from = fields.Datetime.to_datetime(date_from) if date_from else None
+            date_to_value = date_to
+            date_to = fields.Datetime.to_datetime(date_to) if date_to else None
+            if date_to and len(date_to_value.strip()) <= 10:
+                # Дата без часу - до кінця цього дня
+                date_to += timedelta(days=1)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        KpiData = request.env['smartlogger.data']
+        KpiData._get_export_model(bucket).check_access_rights('read')
+        # Запит експорту минає правила записів - станції відбираються через ORM
+        Station = request.env['smartlogger.station']
+        allowed_ids = Station.search([('id', 'in', station_list)] if station_list else []).ids
+        columns, query, params = KpiData._get_export_query(bucket, allowed_ids, date_from, date_to)
+
+        filename = f"smartlogger_kpi_{bucket}_{fields.Date.today()}.{format}"
+        return Response(
+            self._stream_rows(request.env.registry, format, columns, query, params),
+            headers=[
+                ('Content-Type', EXPORT_FORMATS[format]),
+                ('Content-Disposition', content_disposition(filename)),
+                ('Cache-Control', 'no-store'),
+            ],
+            direct_passthrough=True,
+        )
+
+    def _stream_rows(self, registry, export_format, columns, query, params):
+        """Генератор відповіді: власна транзакція та серверний курсор SQL (DECLARE/FETCH).
+
+        Курсор запиту вже закритий, коли werkzeug читає тіло відповіді,
+        тому генератор відкриває окремий курсор реєстру, а рядки
+        отримуються порціями FETCH з курсора, оголошеного в його транзакції.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if export_format == 'csv':
+            writer.writerow(columns)
+
+        row_count = 0
+        cursor_name = f"smartlogger_export_{uuid.uuid4().hex}"
+        with registry.cursor() as cr:
+            cr.execute("SET TRANSACTION READ ONLY")
+            cr.execute(f"DECLARE {cursor_name} NO SCROLL CURSOR FOR {query}", params)
+            while True:
+                cr.execute(f"FETCH FORWARD {EXPORT_FETCH_SIZE} FROM {cursor_name}")
+                rows = cr.fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    if export_format == 'csv':
+                        writer.writerow(row)
+                    else:
+                        buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+                        buffer.write('\n')
+                    row_count += 1
+                    if row_count % EXPORT_FLUSH_ROWS == 0:
+                        yield buffer.getvalue().encode('utf-8')
+                        buffer.seek(0)
+                        buffer.truncate()
+            cr.execute(f"CLOSE {cursor_name}")
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+        _logger.info("Експорт KPI: передано %d рядків (%s)", row_count, export_format)
@@ -1,3 +1,11 @@
 from . import smartlogger_station
 from . import smartlogger_data
-from . import smartlogger_dashboard
\ No newline at end of file
+from . import smartlogger_rollup
+from . import smartlogger_device
+from . import smartlogger_device_data
+from . import smartlogger_backfill
+from . import smartlogger_alert
+from . import smartlogger_dashboard_cache
+from . import smartlogger_dashboard
+from . import smartlogger_sync_job
+from . import smartlogger_sync_run
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_alert.py
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Правила алертів: код -> (назва, важливість)
+ALERT_RULES = {
+    'stale_sync': ('Застаріла синхронізація', 'warning'),
+    'low_efficiency': ('Низька ефективність', 'error'),
+    'status_error': ('Помилка станції', 'error'),
+    'maintenance': ('Обслуговування', 'info'),
+}
+
+# Правила, що залежать лише від статусу станції (перевіряються при його зміні)
+STATUS_ALERT_RULES = ('status_error', 'maintenance')
+
+
+class SmartLoggerAlert(models.Model):
+    _name = 'smartlogger.alert'
+    _description = 'Алерт станції SmartLogger'
+    _order = 'opened_at DESC'
+
+    station_id = fields.Many2one('smartlogger.station', string='Станція', required=True,
+                                 ondelete='cascade', index=True)
+    rule = fields.Selection([(code, label) for code, (label, severity) in ALERT_RULES.items()],
+                            string='Правило', required=True)
+    severity = fields.Selection([
+        ('error', 'Помилка'),
+        ('warning', 'Попередження'),
+        ('info', 'Інформація'),
+    ], string='Важливість', required=True)
+    state = fields.Selection([
+        ('open', 'Відкритий'),
+        ('resolved', 'Вирішений'),
+    ], string='Стан', default='open', required=True)
+    message = fields.Char('Повідомлення')
+    value = fields.Float('Значення', help="Виміряне значення, що спрацювало правило (год. затримки, ефективність %).")
+    opened_at = fields.Datetime('Відкрито', required=True)
+    last_seen_at = fields.Datetime('Останнє підтвердження')
+    resolved_at = fields.Datetime('Вирішено')
+
+    def init(self):
+        """Не більше одного відкритого алерту на станцію та правило (частковий унікальний індекс)."""
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS smartlogger_alert_open_unique
+                ON smartlogger_alert (station_id, rule)
+             WHERE state = 'open'
+        """)
+
+    @api.model
+    def _get_efficiency_thresholds(self):
+        """Пороги правила низької ефективності: (частка медіани парку, мінімальна медіана %)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        ratio = float(IrConfigParameter.get_param('huawei.fusionsolar.alert_low_efficiency_ratio', '0.5'))
+        min_median = float(IrConfigParameter.get_param('huawei.fusionsolar.alert_min_fleet_efficiency', '5.0'))
+        return ratio, min_median
+
+    @api.model
+    def _get_fleet_median_efficiency(self):
+        """Медіана ефективності підключених станцій - опорний рівень для правила low_efficiency."""
+        self.env.cr.execute("""
+            SELECT percentile_cont(0.5) WITHIN GROUP (ORDER BY efficiency)
+              FROM smartlogger_station
+             WHERE connection_status = 'connected'
+               AND capacity > 0
+        """)
+        return self.env.cr.fetchone()[0] or 0.0
+
+    @api.model
+    def _evaluate_stations(self, stations, rules=None):
+        """Перевіряє правила алертів лише для переданих станцій.
+
+        Спрацьовані правила відкривають алерт або оновлюють значення та
+        повідомлення вже відкритого (INSERT ... ON CONFLICT за частковим
+        індексом), а відкриті алерти перевірених правил, що більше не
+        спрацьовують, закриваються. Повертає кількість відкритих, оновлених
+        (змінилось повідомлення) і вирішених алертів.
+        """
+        if not stations:
+            return {'opened': 0, 'refreshed': 0, 'resolved': 0}
+        rules = tuple(rules or ALERT_RULES)
+        now = fields.Datetime.now()
+
+        status_selection = dict(stations._fields['status'].selection)
+        fleet_median = 0.0
+        if 'low_efficiency' in rules:
+            ratio, min_median = self._get_efficiency_thresholds()
+            fleet_median = self._get_fleet_median_efficiency()
+
+        triggered = []
+        for station in stations:
+            if 'stale_sync' in rules and station.connection_status == 'outdated':
+                delay_hours = (now - station.last_sync).total_seconds() / 3600
+                triggered.append((station.id, 'stale_sync', delay_hours,
+                                  f'Остання синхронізація: {int(delay_hours)} год. тому'))
+
+            if 'status_error' in rules and station.status in ('error', 'sync_error'):
+                triggered.append((station.id, 'status_error', 0.0,
+                                  f'Статус: {status_selection.get(station.status, station.status)}'))
+
+            if 'maintenance' in rules and station.status == 'maintenance':
+                triggered.append((station.id, 'maintenance', 0.0,
+                                  f'Статус: {status_selection.get(station.status, station.status)}'))
+
+            # Вночі та в похмуру погоду медіана парку низька - правило не перевіряється
+            if ('low_efficiency' in rules and fleet_median >= min_median and station.capacity > 0
+                    and station.connection_status == 'connected'
+                    and station.efficiency < fleet_median * ratio):
+                triggered.append((station.id, 'low_efficiency', station.efficiency,
+                                  f'Низька ефективність: {station.efficiency:.1f}% '
+                                  f'(медіана парку {fleet_median:.1f}%)'))
+
+        opened = refreshed = 0
+        if triggered:
+            # Повідомлення відкритих алертів - щоб знати, чи змінились дані дашборду
+            self.env.cr.execute("""
+                SELECT station_id, rule, message
+                  FROM smartlogger_alert
+                 WHERE state = 'open'
+                   AND station_id IN %s
+                   AND rule IN %s
+            """, [tuple(stations.ids), rules])
+            open_messages = {(station_id, rule): message for station_id, rule, message in self.env.cr.fetchall()}
+            refreshed = sum(1 for station_id, rule, value, message in triggered
+                            if (station_id, rule) in open_messages
+                            and open_messages[(station_id, rule)] != message)
+
+            values_sql = ', '.join(['(%s, %s, %s, %s, %s)'] * len(triggered))
+            params = [now, now, self.env.uid, now, self.env.uid, now]
+            for station_id, rule, value, message in triggered:
+                params.extend([station_id, rule, ALERT_RULES[rule][1], float(value), message])
+            self.env.cr.execute(f"""
+                INSERT INTO smartlogger_alert AS a
+                       (station_id, rule, severity, value, message, state, opened_at, last_seen_at,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT v.station_id, v.rule, v.severity, v.value, v.message, 'open', %s, %s, %s, %s, %s, %s
+                  FROM (VALUES {values_sql}) AS v(station_id, rule, severity, value, message)
+                ON CONFLICT (station_id, rule) WHERE state = 'open' DO UPDATE SET
+                       value = EXCLUDED.value,
+                       message = EXCLUDED.message,
+                       last_seen_at = EXCLUDED.last_seen_at,
+                       write_uid = EXCLUDED.write_uid,
+                       write_date = EXCLUDED.write_date
+                RETURNING (xmax = 0)
+            """, params)
+            opened = sum(1 for (inserted,) in self.env.cr.fetchall() if inserted)
+
+        # Автоматичне закриття: перевірене правило більше не спрацьовує
+        resolve_sql = """
+            UPDATE smartlogger_alert
+               SET state = 'resolved', resolved_at = %s, write_uid = %s, write_date = %s
+             WHERE state = 'open'
+               AND station_id IN %s
+               AND rule IN %s
+        """
+        resolve_params = [now, self.env.uid, now, tuple(stations.ids), rules]
+        if triggered:
+            resolve_sql += " AND (station_id, rule) NOT IN %s"
+            resolve_params.append(tuple((station_id, rule) for station_id, rule, value, message in triggered))
+        self.env.cr.execute(resolve_sql, resolve_params)
+        resolved = self.env.cr.rowcount
+
+        if triggered or resolved:
+            # Значення відкритих алертів оновлюються при кожній перевірці
+            if hasattr(self, 'invalidate_model'):
+                self.invalidate_model()
+            else:
+                self.invalidate_cache()
+        if opened or refreshed or resolved:
+            # Відкриті алерти входять до даних дашборду
+            self.env['smartlogger.dashboard.cache']._bump_generation()
+            _logger.info("Алерти станцій: відкрито %d, оновлено %d, вирішено %d", opened, refreshed, resolved)
+        return {'opened': opened, 'refreshed': refreshed, 'resolved': resolved}
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_backfill.py
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from datetime import datetime, timedelta
+import calendar
+import logging
+import time
+
+from .smartlogger_rollup import ROLLUP_MODELS
+from .smartlogger_solar import is_sun_up
+
+_logger = logging.getLogger(__name__)
+
+# Ліміт FusionSolar: кодів станцій у getKpiStationHour на один запит
+BACKFILL_BATCH_SIZE = 100
+
+# Рядків в одному multi-row INSERT
+BACKFILL_INSERT_CHUNK = 1000
+
+# Межі зсуву місцевого часу станції від UTC (години)
+MIN_UTC_OFFSET = -12
+MAX_UTC_OFFSET = 14
+
+
+class SmartLoggerBackfill(models.AbstractModel):
+    _name = 'smartlogger.backfill'
+    _description = 'Дозавантаження історії KPI SmartLogger'
+
+    @api.model
+    def _get_backfill_settings(self):
+        """Глибина пошуку пропусків (днів) та бюджет API запитів на один запуск."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        days = int(IrConfigParameter.get_param('huawei.fusionsolar.backfill_days', '7'))
+        max_calls = int(IrConfigParameter.get_param('huawei.fusionsolar.backfill_max_calls', '20'))
+
+        # Пропуски шукаються за погодинними зведеннями, тому не глибше їх терміну зберігання
+        hourly_retention = self.env['smartlogger.kpi.hourly']._get_retention_days()
+        if hourly_retention > 0:
+            days = min(days, hourly_retention)
+        return days, max_calls
+
+    @api.model
+    def run_backfill(self):
+        """Дозавантажує пропущені години історії KPI з getKpiStationHour (cron).
+
+        Пропуски шукаються після контрольної точки кожної станції
+        (backfilled_until), запити виконуються по дню та до 100 станцій,
+        а кількість запитів за запуск обмежена backfill_max_calls, щоб не
+        забирати ліміти FusionSolar у синхронізації поточних даних.
+        Після кожного запиту записи та контрольні точки фіксуються, тому
+        перерваний запуск продовжується з того ж місця.
+        """
+        stats = {'calls': 0, 'rows': 0, 'stations': 0, 'budget_exhausted': False}
+        days, max_calls = self._get_backfill_settings()
+        if days <= 0 or max_calls <= 0:
+            _logger.info("Дозавантаження історії KPI вимкнено в конфігурації")
+            return stats
+
+        Station = self.env['smartlogger.station']
+        try:
+            Station._check_api_blocked_status()
+            Station._check_frequency_block()
+        except UserError as e:
+            _logger.warning("Дозавантаження історії KPI пропущено: %s", str(e))
+            return stats
+
+        start_time = time.monotonic()
+        last_hour = fields.Datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+        gaps = self._find_gaps(last_hour - timedelta(days=days), last_hour)
+        completed = True
+        if gaps:
+            base_url, username, password, batch_size, request_delay = Station._get_fusionsolar_api_credentials()
+            session = Station._open_api_session(base_url, username, password)
+            try:
+                completed = self._backfill_gaps(session, base_url, gaps, last_hour, max_calls, stats)
+            finally:
+                Station._close_api_session(session)
+
+        if completed:
+            # Усі пропуски вікна перевірені: наступний запуск почне з поточної години
+            self._advance_checkpoint(None, last_hour + timedelta(hours=1))
+
+        if stats['rows']:
+            self.env['smartlogger.dashboard.cache']._bump_generation()
+        _logger.info("Дозавантаження історії KPI: %d запитів, %d годин записано для %d станцій за %.1f с%s",
+                     stats['calls'], stats['rows'], stats['stations'], time.monotonic() - start_time,
+                     " (бюджет запитів вичерпано)" if stats['budget_exhausted'] else "")
+        return stats
+
+    @api.model
+    def _get_utc_offset(self, latitude, longitude):
+        """Наближений зсув місцевого часу станції від UTC (цілі години) за довготою.
+
+        getKpiStationHour повертає місцеву календарну добу станції, а окремого
+        поля часового поясу немає. Похибка відносно поясу (до години-двох)
+        припадає на місцеву північ, тобто на нічні години без виробітку.
+        Станції без координат вважаються станціями в UTC.
+        """
+        if not latitude and not longitude:
+            return 0
+        return min(max(int(round(longitude / 15.0)), MIN_UTC_OFFSET), MAX_UTC_OFFSET)
+
+    @api.model
+    def _find_gaps(self, window_start, last_hour):
+        """Години без погодинного зведення після контрольної точки станцій.
+
+        Пропуски групуються за місцевою добою станції (та її зсувом від UTC),
+        бо саме її повертає getKpiStationHour. З нічним режимом
+        (night_sync_interval) години, коли сонце на станції під горизонтом,
+        пропусками не вважаються: станції тоді опитуються рідше, а виробітку немає.
+        Повертає {(місцевий день, зсув годин): {station_id: множина годин UTC}}.
+        """
+        self.env.cr.execute("""
+            SELECT s.id, s.latitude, s.longitude, h.hour
+              FROM smartlogger_station s
+             CROSS JOIN LATERAL generate_series(
+                       GREATEST(COALESCE(s.backfilled_until, %s), %s), %s, interval '1 hour') AS h(hour)
+             WHERE s.station_code IS NOT NULL
+               AND NOT EXISTS (SELECT 1
+                                 FROM smartlogger_kpi_hourly k
+                                WHERE k.station_id = s.id
+                                  AND k.period_start = h.hour)
+        """, [window_start, window_start, last_hour])
+
+        skip_night = self.env['smartlogger.station']._get_night_sync_interval() > 0
+        gaps = {}
+        for station_id, latitude, longitude, hour in self.env.cr.fetchall():
+            if (skip_night and (latitude or longitude)
+                    and not is_sun_up(latitude, longitude, hour)
+                    and not is_sun_up(latitude, longitude, hour + timedelta(hours=1))):
+                continue
+            offset = self._get_utc_offset(latitude, longitude)
+            local_day = (hour + timedelta(hours=offset)).date()
+            gaps.setdefault((local_day, offset), {}).setdefault(station_id, set()).add(hour)
+        return gaps
+
+    @api.model
+    def _backfill_gaps(self, session, base_url, gaps, last_hour, max_calls, stats):
+        """Запитує getKpiStationHour для пропусків, від найстаріших днів, у межах бюджету.
+
+        Повернуті години зіставляються з усіма відкритими пропусками станції
+        (не лише запитаної доби), а контрольна точка станції зсувається лише
+        до кінця місцевої доби, на яку API відповів успішно: години цієї доби
+        або записані, або API підтвердив, що даних немає.
+        Повертає False, якщо обробку перервано (бюджет вичерпано або помилка API).
+        """
+        Station = self.env['smartlogger.station']
+        open_gaps = {}
+        for day_gaps in gaps.values():
+            for station_id, hours in day_gaps.items():
+                open_gaps.setdefault(station_id, set()).update(hours)
+        code_by_id = {station.id: station.station_code for station in Station.browse(list(open_gaps))}
+        filled_stations = set()
+
+        for day, offset in sorted(gaps):
+            # Години, вже заповнені відповіддю за сусідню добу, повторно не запитуються
+            day_gaps = {station_id: hours & open_gaps[station_id]
+                        for station_id, hours in gaps[(day, offset)].items()}
+            day_ids = sorted(station_id for station_id, hours in day_gaps.items() if hours)
+            # Місцева доба станцій у UTC: [північ - зсув, наступна північ - зсув)
+            day_start = datetime.combine(day, datetime.min.time()) - timedelta(hours=offset)
+            checkpoint = min(day_start + timedelta(days=1), last_hour + timedelta(hours=1))
+
+            for i in range(0, len(day_ids), BACKFILL_BATCH_SIZE):
+                if stats['calls'] >= max_calls:
+                    stats['budget_exhausted'] = True
+                    stats['stations'] = len(filled_stations)
+                    return False
+
+                batch_ids = day_ids[i:i + BACKFILL_BATCH_SIZE]
+                payload = {
+                    'stationCodes': ','.join(code_by_id[station_id] for station_id in batch_ids),
+                    # collectTime - будь-яка мітка всередині місцевої доби (мс): місцевий полудень
+                    'collectTime': calendar.timegm((day_start + timedelta(hours=12)).timetuple()) * 1000,
+                }
+                data = Station._api_call(session, base_url, 'getKpiStationHour', payload, timeout=60)
+                stats['calls'] += 1
+
+                if not data or not data.get('success'):
+                    # Контрольна точка не зсувається: день буде повторено наступним запуском
+                    _logger.warning("getKpiStationHour за %s не вдався: failCode=%s",
+                                    day, data.get('failCode') if data else 'Немає відповіді')
+                    stats['stations'] = len(filled_stations)
+                    return False
+
+                id_by_code = {code_by_id[station_id]: station_id for station_id in batch_ids}
+                samples = self._parse_hour_kpi(data.get('data') or [], id_by_code, open_gaps)
+                inserted = self._write_backfill_samples(samples)
+                stats['rows'] += inserted
+                for sample in samples:
+                    open_gaps[sample['station_id']].discard(sample['timestamp'])
+                    filled_stations.add(sample['station_id'])
+
+                self._advance_checkpoint(batch_ids, checkpoint)
+                Station._commit_progress()
+
+        stats['stations'] = len(filled_stations)
+        return True
+
+    @api.model
+    def _parse_hour_kpi(self, items, id_by_code, open_gaps):
+        """Перетворює записи getKpiStationHour на KPI зразки лише для пропущених годин.
+
+        open_gaps - {station_id: множина пропущених годин UTC} станції за все вікно.
+
+        inverter_power - енергія за годину (кВт·год), тобто середня потужність години (кВт),
+        тому рядки позначаються is_backfill; добова енергія - наростаючий підсумок годин дня. Місячні, річні та
+        загальні лічильники погодинний ендпоінт не повертає (None).
+        """
+        Station = self.env['smartlogger.station']
+        weight = Station._get_live_samples_per_hour()
+        by_station = {}
+        for item in items:
+            station_id = id_by_code.get(item.get('stationCode'))
+            if not station_id or not item.get('collectTime'):
+                continue
+            hour = datetime.utcfromtimestamp(int(item['collectTime']) / 1000).replace(minute=0, second=0, microsecond=0)
+            energy = Station._safe_float_extract(item.get('dataItemMap') or {}, ['inverter_power', 'ongrid_power'])
+            by_station.setdefault(station_id, []).append((hour, energy))
+
+        samples = []
+        for station_id, hours in by_station.items():
+            missing = open_gaps.get(station_id, set())
+            daily_energy = 0.0
+            for hour, energy in sorted(hours):
+                daily_energy += energy
+                if hour not in missing:
+                    continue
+                samples.append({
+                    'station_id': station_id,
+                    'timestamp': hour,
+                    'current_power': energy,
+                    'daily_energy': daily_energy,
+                    'monthly_energy': None,
+                    'yearly_energy': None,
+                    'lifetime_energy': None,
+                    'weight': weight,
+                })
+        return samples
+
+    @api.model
+    def _write_backfill_samples(self, samples):
+        """Записує дозавантажені години в smartlogger.data (is_backfill) та зведення; повертає кількість нових рядків."""
+        if not samples:
+            return 0
+
+        now = fields.Datetime.now()
+        inserted = []
+        for i in range(0, len(samples), BACKFILL_INSERT_CHUNK):
+            chunk = samples[i:i + BACKFILL_INSERT_CHUNK]
+            params = []
+            for sample in chunk:
+                params.extend([sample['station_id'], sample['timestamp'], sample['current_power'],
+                               sample['daily_energy'], self.env.uid, now, self.env.uid, now])
+            self.env.cr.execute(f"""
+                INSERT INTO smartlogger_data
+                       (station_id, "timestamp", current_power, daily_energy, is_backfill,
+                        create_uid, create_date, write_uid, write_date)
+                VALUES {', '.join(['(%s, %s, %s, %s, TRUE, %s, %s, %s, %s)'] * len(chunk))}
+                ON CONFLICT (station_id, "timestamp") DO NOTHING
+                RETURNING station_id, "timestamp"
+            """, params)
+            inserted.extend(self.env.cr.fetchall())
+
+        # Зведення - лише для справді вставлених годин, по одному upsert на годину та рівень
+        inserted = set(inserted)
+        by_timestamp = {}
+        for sample in samples:
+            if (sample['station_id'], sample['timestamp']) in inserted:
+                by_timestamp.setdefault(sample['timestamp'], []).append(sample)
+        for timestamp, hour_samples in by_timestamp.items():
+            for model_name in ROLLUP_MODELS:
+                self.env[model_name]._upsert_samples(hour_samples, timestamp)
+
+        return len(inserted)
+
+    @api.model
+    def _advance_checkpoint(self, station_ids, checkpoint):
+        """Зсуває контрольну точку дозавантаження станцій (None - усіх) вперед до checkpoint."""
+        query = """
+            UPDATE smartlogger_station
+               SET backfilled_until = %s
+             WHERE (backfilled_until IS NULL OR backfilled_until < %s)
+        """
+        params = [checkpoint, checkpoint]
+        if station_ids is not None:
+            query += " AND id IN %s"
+            params.append(tuple(station_ids))
+        self.env.cr.execute(query, params)
+
+        Station = self.env['smartlogger.station']
+        if station_ids is not None:
+            Station._invalidate_station_cache(Station.browse(station_ids), ['backfilled_until'])
+        elif hasattr(Station, 'invalidate_model'):
+            Station.invalidate_model(['backfilled_until'])
+        else:
+            Station.invalidate_cache(['backfilled_until'])
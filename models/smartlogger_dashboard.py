@@ -2,12 +2,27 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 from datetime import datetime, timedelta
+import csv
+import io
 import json
 import logging
+import pytz
 from typing import Dict, Any, Optional
 
 _logger = logging.getLogger(__name__)
 
+# Інтервали історичних тенденцій (filter_params['bucket']) та формат їх дати
+TREND_BUCKETS = {
+    'hour': '%Y-%m-%d %H:00',
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',
+    'month': '%Y-%m',
+}
+
+# Колонки CSV експорту дашборду (ключі stations_summary)
+DASHBOARD_CSV_COLUMNS = ('station_code', 'name', 'status', 'capacity', 'current_power',
+                         'daily_energy', 'efficiency', 'last_sync')
+
 
 class SmartLoggerDashboard(models.TransientModel):
     _name = 'smartlogger.dashboard'
@@ -54,10 +69,34 @@ class SmartLoggerDashboard(models.TransientModel):
                 - date_from: дата початку періоду
                 - date_to: дата кінця періоду
                 - status: статус станцій
+                - bucket: інтервал історичних тенденцій (hour/day/week/month, за замовчуванням day)
 
         Returns:
             dict: Агреговані дані для дашборду
+
+        Результат кешується в smartlogger.dashboard.cache (спільний для всіх
+        воркерів, окремо для кожного користувача та набору компаній) до
+        наступного запису даних синхронізацією.
         """
+        Cache = self.env['smartlogger.dashboard.cache'].sudo()
+        # Межі діб тенденцій залежать від часового поясу, а набір станцій - від
+        # правил записів користувача, тому кеш спільний лише в межах користувача
+        key = Cache._make_key(dict(filter_params or {}, tz=self._get_trend_timezone(),
+                                   uid=self.env.uid, company_ids=sorted(self.env.companies.ids)))
+        generation = Cache._get_generation()
+
+        dashboard_data = Cache._lookup(key, generation)
+        if dashboard_data is not None:
+            return dashboard_data
+
+        dashboard_data = self._compute_dashboard_data(filter_params)
+        if 'error' not in dashboard_data:
+            Cache._store(key, generation, dashboard_data)
+        return dashboard_data
+
+    @api.model
+    def _compute_dashboard_data(self, filter_params=None):
+        """Обчислює дані дашборду (без кешу), див. get_dashboard_data."""
         try:
             # Базовий домен для пошуку станцій
             domain = []
@@ -71,11 +110,14 @@ class SmartLoggerDashboard(models.TransientModel):
 
             stations = self.env['smartlogger.station'].search(domain)
 
+            # Агрегати парку - один запит до БД
+            fleet = self._query_fleet_metrics(stations)
+
             # Базові агрегати
-            dashboard_data = self._calculate_basic_metrics(stations)
+            dashboard_data = self._calculate_basic_metrics(fleet)
 
             # Додаткові метрики
-            dashboard_data.update(self._calculate_performance_metrics(stations))
+            dashboard_data.update(self._calculate_performance_metrics(fleet))
 
             # Деталі станцій
             dashboard_data['stations_summary'] = self._get_stations_summary(stations)
@@ -89,7 +131,7 @@ class SmartLoggerDashboard(models.TransientModel):
             dashboard_data['alerts'] = self._get_system_alerts(stations)
 
             # Статистика по статусах
-            dashboard_data['status_breakdown'] = self._get_status_breakdown(stations)
+            dashboard_data['status_breakdown'] = self._get_status_breakdown(fleet)
 
             dashboard_data['last_update_time'] = fields.Datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             dashboard_data['filter_applied'] = bool(filter_params)
@@ -109,43 +151,90 @@ class SmartLoggerDashboard(models.TransientModel):
                 'error': str(e)
             }
 
-    def _calculate_basic_metrics(self, stations):
-        """Обчислює базові метрики дашборду"""
-        total_capacity = sum(stations.mapped('capacity'))
-        current_total_power = sum(stations.mapped('current_power'))
-        daily_total_energy = sum(stations.mapped('daily_energy'))
-        monthly_total_energy = sum(stations.mapped('monthly_energy'))
-        yearly_total_energy = sum(stations.mapped('yearly_energy'))
-        lifetime_total_energy = sum(stations.mapped('lifetime_energy'))
+    def _query_fleet_metrics(self, stations):
+        """Агрегати парку станцій одним запитом: суми, кількість активних та розподіл за статусами.
 
+        GROUP BY ROLLUP(status) повертає рядок на кожен статус і підсумковий
+        рядок (GROUPING(status) = 1) з тими самими агрегатами по всіх станціях.
+        """
+        fleet = {
+            'total_stations': 0,
+            'total_capacity': 0.0,
+            'current_total_power': 0.0,
+            'daily_total_energy': 0.0,
+            'monthly_total_energy': 0.0,
+            'yearly_total_energy': 0.0,
+            'lifetime_total_energy': 0.0,
+            'active_stations_count': 0,
+            'status_counts': [],
+        }
+        if not stations:
+            return fleet
+
+        self.env.cr.execute("""
+            SELECT GROUPING(status) AS is_total,
+                   status,
+                   COUNT(*),
+                   COALESCE(SUM(capacity), 0),
+                   COALESCE(SUM(current_power), 0),
+                   COALESCE(SUM(daily_energy), 0),
+                   COALESCE(SUM(monthly_energy), 0),
+                   COALESCE(SUM(yearly_energy), 0),
+                   COALESCE(SUM(lifetime_energy), 0),
+                   COUNT(*) FILTER (WHERE status = 'active')
+              FROM smartlogger_station
+             WHERE id IN %s
+             GROUP BY ROLLUP(status)
+             ORDER BY is_total, status
+        """, [tuple(stations.ids)])
+
+        for row in self.env.cr.fetchall():
+            if row[0]:
+                fleet.update({
+                    'total_stations': row[2],
+                    'total_capacity': row[3],
+                    'current_total_power': row[4],
+                    'daily_total_energy': row[5],
+                    'monthly_total_energy': row[6],
+                    'yearly_total_energy': row[7],
+                    'lifetime_total_energy': row[8],
+                    'active_stations_count': row[9],
+                })
+            else:
+                fleet['status_counts'].append((row[1] or 'unknown', row[2]))
+        return fleet
+
+    def _calculate_basic_metrics(self, fleet):
+        """Обчислює базові метрики дашборду з агрегатів парку"""
         return {
-            'total_stations': len(stations),
-            'total_capacity': total_capacity,
-            'current_total_power': current_total_power,
-            'daily_total_energy': daily_total_energy,
-            'monthly_total_energy': monthly_total_energy,
-            'yearly_total_energy': yearly_total_energy,
-            'lifetime_total_energy': lifetime_total_energy,
+            'total_stations': fleet['total_stations'],
+            'total_capacity': fleet['total_capacity'],
+            'current_total_power': fleet['current_total_power'],
+            'daily_total_energy': fleet['daily_total_energy'],
+            'monthly_total_energy': fleet['monthly_total_energy'],
+            'yearly_total_energy': fleet['yearly_total_energy'],
+            'lifetime_total_energy': fleet['lifetime_total_energy'],
         }
 
-    def _calculate_performance_metrics(self, stations):
-        """Обчислює метрики продуктивності"""
-        total_capacity = sum(stations.mapped('capacity'))
-        current_total_power = sum(stations.mapped('current_power'))
+    def _calculate_performance_metrics(self, fleet):
+        """Обчислює метрики продуктивності з агрегатів парку"""
+        total_stations = fleet['total_stations']
+        total_capacity = fleet['total_capacity']
+        current_total_power = fleet['current_total_power']
 
         # Ефективність системи
         system_efficiency = (current_total_power / total_capacity * 100) if total_capacity > 0 else 0
 
         # Активні станції
-        active_stations = stations.filtered(lambda s: s.status == 'active')
-        active_percentage = (len(active_stations) / len(stations) * 100) if stations else 0
+        active_count = fleet['active_stations_count']
+        active_percentage = (active_count / total_stations * 100) if total_stations else 0
 
         # Середня потужність на станцію
-        avg_power_per_station = current_total_power / len(stations) if stations else 0
+        avg_power_per_station = current_total_power / total_stations if total_stations else 0
 
         return {
             'system_efficiency': round(system_efficiency, 2),
-            'active_stations_count': len(active_stations),
+            'active_stations_count': active_count,
             'active_percentage': round(active_percentage, 2),
             'avg_power_per_station': round(avg_power_per_station, 2),
         }
@@ -172,134 +261,105 @@ class SmartLoggerDashboard(models.TransientModel):
 
         return stations_summary
 
+    def _get_trend_timezone(self):
+        """Часовий пояс діб тенденцій: компанії, інакше користувача, інакше UTC.
+
+        Добовий лічильник енергії FusionSolar скидається опівночі за
+        місцевим часом станцій, а окремого поля часового поясу станції немає.
+        """
+        tz = self.env.company.partner_id.tz or self.env.user.tz
+        return tz if tz in pytz.all_timezones_set else 'UTC'
+
     def _get_historical_trends(self, stations, filter_params):
-        """Отримує історичні тенденції"""
+        """Отримує історичні тенденції, агреговані в БД за інтервалами filter_params['bucket'].
+
+        Інтервали та межі діб рахуються в часовому поясі _get_trend_timezone;
+        total_energy - енергія, вироблена за інтервал (сума приростів добового
+        лічильника), а не сума його показів.
+        """
         if not stations:
             return []
 
         # Параметри періоду
         date_to = datetime.now()
         date_from = date_to - timedelta(days=7)  # За замовчуванням 7 днів
+        bucket = 'day'
 
         if filter_params:
             if filter_params.get('date_from'):
                 date_from = datetime.strptime(filter_params['date_from'], '%Y-%m-%d')
             if filter_params.get('date_to'):
                 date_to = datetime.strptime(filter_params['date_to'], '%Y-%m-%d')
-
-        # Запит історичних даних
-        domain = [
-            ('station_id', 'in', stations.ids),
-            ('timestamp', '>=', date_from),
-            ('timestamp', '<=', date_to)
-        ]
-
-        historical_records = self.env['smartlogger.data'].search(domain, order='timestamp ASC')
-
-        # Групування по датах
-        daily_data = {}
-        for record in historical_records:
-            date_key = record.timestamp.strftime('%Y-%m-%d')
-            if date_key not in daily_data:
-                daily_data[date_key] = {
-                    'date': date_key,
-                    'total_power': 0,
-                    'total_energy': 0,
-                    'record_count': 0
-                }
-            daily_data[date_key]['total_power'] += record.current_power
-            daily_data[date_key]['total_energy'] += record.daily_energy
-            daily_data[date_key]['record_count'] += 1
-
-        # Перетворення в список
-        trends = []
-        for date_key in sorted(daily_data.keys()):
-            data = daily_data[date_key]
-            trends.append({
-                'date': date_key,
-                'avg_power': round(data['total_power'] / data['record_count'], 2) if data['record_count'] > 0 else 0,
-                'total_energy': round(data['total_energy'], 2)
-            })
-
-        return trends
+            if filter_params.get('bucket') in TREND_BUCKETS:
+                bucket = filter_params['bucket']
+
+        # Дати фільтра - місцеві, period_start зведень - UTC
+        tz_name = self._get_trend_timezone()
+        tz = pytz.timezone(tz_name)
+        date_from = tz.localize(date_from).astimezone(pytz.utc).replace(tzinfo=None)
+        date_to = tz.localize(date_to).astimezone(pytz.utc).replace(tzinfo=None)
+
+        # Погодинні зведення отримують кожен зразок, зокрема незмінені (без рядка
+        # в smartlogger.data), тому читаються як ступінчаста функція без пропусків.
+        # Енергія години - приріст добового лічильника відносно попередньої години
+        # (на початку нової місцевої доби лічильник скидається, тоді береться саме значення).
+        self.env.cr.execute("""
+            SELECT date_trunc(%s, local_start) AS bucket_start,
+                   SUM(sum_power) / NULLIF(SUM(sample_count), 0) AS avg_power,
+                   SUM(hour_energy) AS total_energy
+              FROM (SELECT local_start, sum_power, sample_count,
+                           CASE WHEN last_daily_energy >= prev_energy
+                                 AND local_start::date = prev_local_start::date
+                                THEN last_daily_energy - prev_energy
+                                ELSE COALESCE(last_daily_energy, 0) END AS hour_energy
+                      FROM (SELECT period_start AT TIME ZONE 'UTC' AT TIME ZONE %s AS local_start,
+                                   sum_power, sample_count, last_daily_energy,
+                                   LAG(last_daily_energy) OVER w AS prev_energy,
+                                   LAG(period_start AT TIME ZONE 'UTC' AT TIME ZONE %s) OVER w AS prev_local_start
+                              FROM smartlogger_kpi_hourly
+                             WHERE station_id IN %s
+                               AND period_start >= %s
+                               AND period_start <= %s
+                            WINDOW w AS (PARTITION BY station_id ORDER BY period_start)) AS h) AS e
+             GROUP BY bucket_start
+             ORDER BY bucket_start
+        """, [bucket, tz_name, tz_name, tuple(stations.ids), date_from, date_to])
+
+        return [{
+            'date': bucket_start.strftime(TREND_BUCKETS[bucket]),
+            'avg_power': round(avg_power or 0.0, 2),
+            'total_energy': round(total_energy or 0.0, 2),
+        } for bucket_start, avg_power, total_energy in self.env.cr.fetchall()]
 
     def _get_system_alerts(self, stations):
-        """Отримує системні алерти"""
-        alerts = []
-        current_time = datetime.now()
-
-        for station in stations:
-            # Алерт про відсутність синхронізації
-            if station.last_sync:
-                sync_delay = current_time - station.last_sync
-                if sync_delay.total_seconds() > 3600:  # Більше 1 години
-                    alerts.append({
-                        'type': 'warning',
-                        'station_id': station.id,
-                        'station_name': station.name,
-                        'message': f'Остання синхронізація: {sync_delay.seconds // 3600} год. тому'
-                    })
-
-            # Алерт про низьку ефективність
-            if station.capacity > 0:
-                efficiency = (station.current_power / station.capacity) * 100
-                if efficiency < 50:  # Менше 50% ефективності
-                    alerts.append({
-                        'type': 'error',
-                        'station_id': station.id,
-                        'station_name': station.name,
-                        'message': f'Низька ефективність: {efficiency:.1f}%'
-                    })
-
-            # Алерт про статус
-            if hasattr(station, 'status') and station.status in ['error', 'maintenance']:
-                # Отримуємо словник вибору статусів
-                status_field = station._fields.get('status')
-                if status_field and hasattr(status_field, 'selection'):
-                    status_selection = dict(status_field.selection)
-                    status_label = status_selection.get(station.status, station.status)
-                else:
-                    status_label = station.status
-
-                alerts.append({
-                    'type': 'error' if station.status == 'error' else 'info',
-                    'station_id': station.id,
-                    'station_name': station.name,
-                    'message': f'Статус: {status_label}'
-                })
-
-        return alerts
-
-    def _get_status_breakdown(self, stations):
-        """Отримує розподіл станцій по статусах"""
-        status_counts = {}
-
-        # Перевіряємо, чи існує поле status
-        if hasattr(self.env['smartlogger.station'], '_fields') and 'status' in self.env['smartlogger.station']._fields:
-            status_field = self.env['smartlogger.station']._fields['status']
-            if hasattr(status_field, 'selection'):
-                status_selection = dict(status_field.selection)
-            else:
-                status_selection = {}
-        else:
-            status_selection = {}
-
-        for station in stations:
-            status = getattr(station, 'status', 'unknown')
-            if status not in status_counts:
-                status_counts[status] = 0
-            status_counts[status] += 1
-
-        breakdown = []
-        for status, count in status_counts.items():
-            breakdown.append({
-                'status': status,
-                'status_label': status_selection.get(status, status),
-                'count': count,
-                'percentage': round((count / len(stations)) * 100, 1) if stations else 0
-            })
+        """Отримує відкриті алерти станцій (оцінюються синхронізацією, див. smartlogger.alert)"""
+        if not stations:
+            return []
 
-        return breakdown
+        alerts = self.env['smartlogger.alert'].search([
+            ('state', '=', 'open'),
+            ('station_id', 'in', stations.ids),
+        ])
+        return [{
+            'type': alert.severity,
+            'rule': alert.rule,
+            'station_id': alert.station_id.id,
+            'station_name': alert.station_id.name,
+            'message': alert.message,
+            'opened_at': alert.opened_at.strftime('%Y-%m-%d %H:%M:%S'),
+        } for alert in alerts]
+
+    def _get_status_breakdown(self, fleet):
+        """Отримує розподіл станцій по статусах з агрегатів парку"""
+        status_selection = dict(self.env['smartlogger.station']._fields['status'].selection)
+        total_stations = fleet['total_stations']
+
+        return [{
+            'status': status,
+            'status_label': status_selection.get(status, status),
+            'count': count,
+            'percentage': round((count / total_stations) * 100, 1) if total_stations else 0
+        } for status, count in fleet['status_counts']]
 
     @api.model
     def get_station_details(self, station_id):
@@ -313,15 +373,18 @@ class SmartLoggerDashboard(models.TransientModel):
             ('station_id', '=', station_id)
         ], order='timestamp DESC', limit=10)
 
-        # Статистика за період
+        # Статистика за період - з погодинних зведень: сирі рядки є лише точками
+        # зміни значень (skip_unchanged_samples), а зведення отримують кожен зразок
         date_from = datetime.now() - timedelta(days=30)
-        period_data = self.env['smartlogger.data'].search([
-            ('station_id', '=', station_id),
-            ('timestamp', '>=', date_from)
-        ])
-
-        avg_power = sum(period_data.mapped('current_power')) / len(period_data) if period_data else 0
-        max_power = max(period_data.mapped('current_power')) if period_data else 0
+        self.env.cr.execute("""
+            SELECT SUM(sum_power) / NULLIF(SUM(sample_count), 0),
+                   MAX(max_power),
+                   COALESCE(SUM(sample_count), 0)
+              FROM smartlogger_kpi_hourly
+             WHERE station_id = %s
+               AND period_start >= %s
+        """, [station.id, date_from])
+        avg_power, max_power, sample_count = self.env.cr.fetchone()
 
         return {
             'station_info': {
@@ -339,9 +402,9 @@ class SmartLoggerDashboard(models.TransientModel):
                 'daily_energy': record.daily_energy,
             } for record in recent_data],
             'period_stats': {
-                'avg_power': round(avg_power, 2),
-                'max_power': round(max_power, 2),
-                'total_records': len(period_data),
+                'avg_power': round(avg_power or 0.0, 2),
+                'max_power': round(max_power or 0.0, 2),
+                'total_records': sample_count,
             }
         }
 
@@ -353,8 +416,13 @@ class SmartLoggerDashboard(models.TransientModel):
         if format_type == 'json':
             return json.dumps(dashboard_data, indent=2, default=str)
         elif format_type == 'csv':
-            # Реалізація експорту в CSV
-            pass
+            # Зведення по станціях; історія KPI - потоковий експорт /smartlogger/export/kpi
+            stations_summary = dashboard_data.get('stations_summary', [])
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=DASHBOARD_CSV_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(stations_summary)
+            return buffer.getvalue()
 
         return dashboard_data
 
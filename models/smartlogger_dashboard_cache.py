@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_dashboard_cache.py
+
+from odoo import models, fields, api
+import hashlib
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Лічильник "поколінь" даних: збільшується при кожному записі KPI синхронізацією
+DATA_GENERATION_PARAM = 'huawei.fusionsolar.data_generation'
+
+
+class SmartLoggerDashboardCache(models.Model):
+    _name = 'smartlogger.dashboard.cache'
+    _description = 'Кеш даних дашборду SmartLogger'
+
+    key = fields.Char('Ключ фільтрів', required=True, index=True)
+    generation = fields.Integer('Покоління даних', required=True)
+    payload = fields.Text('Дані дашборду (JSON)')
+    computed_at = fields.Datetime('Обчислено', required=True)
+
+    _sql_constraints = [
+        ('key_unique', 'unique(key)', 'Запис кешу з таким ключем вже існує!'),
+    ]
+
+    @api.model
+    def _make_key(self, filter_params):
+        """Ключ кешу з нормалізованих filter_params (порожні значення та порядок ID не важливі)."""
+        normalized = {}
+        for name, value in (filter_params or {}).items():
+            if value in (None, False, '', [], ()):
+                continue
+            if name == 'station_ids':
+                value = sorted(set(value))
+            normalized[name] = value
+        return hashlib.md5(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+    @api.model
+    def _get_generation(self):
+        """Поточне покоління даних (читається з БД, минаючи ormcache параметрів)."""
+        self.env.cr.execute("SELECT value FROM ir_config_parameter WHERE key = %s", [DATA_GENERATION_PARAM])
+        row = self.env.cr.fetchone()
+        try:
+            return int(row[0]) if row else 0
+        except (ValueError, TypeError):
+            return 0
+
+    @api.model
+    def _bump_generation(self):
+        """Збільшує покоління даних після фіксації поточної транзакції синхронізації.
+
+        Лічильник оновлюється коротким окремим курсором у postcommit: рядок
+        параметра не блокується на час транзакції синхронізації (інакше всі
+        записувачі KPI виконувались би по черзі і могли б взаємно блокуватися),
+        а кеш стає недійсним лише тоді, коли нові дані вже видимі читачам.
+        Кілька викликів в одній транзакції дають одне збільшення.
+        """
+        cr = self.env.cr
+        if not hasattr(cr, 'postcommit'):
+            cr.after('commit', self._increment_generation)
+            return
+        if cr.postcommit.data.get(DATA_GENERATION_PARAM):
+            return
+        cr.postcommit.data[DATA_GENERATION_PARAM] = True
+        cr.postcommit.add(self._increment_generation)
+
+    @api.model
+    def _increment_generation(self):
+        """Збільшує лічильник поколінь в окремій короткій транзакції."""
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO ir_config_parameter (key, value, create_uid, create_date, write_uid, write_date)
+                VALUES (%s, '1', %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC')
+                ON CONFLICT (key) DO UPDATE
+                   SET value = (COALESCE(NULLIF(ir_config_parameter.value, ''), '0')::bigint + 1)::text,
+                       write_date = EXCLUDED.write_date
+            """, [DATA_GENERATION_PARAM, self.env.uid, self.env.uid])
+
+    @api.model
+    def _get_ttl_seconds(self):
+        """Максимальний вік запису кешу (дані, що залежать від часу, як-от алерти про затримку)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return int(IrConfigParameter.get_param('huawei.fusionsolar.dashboard_cache_ttl', '900'))
+
+    @api.model
+    def _lookup(self, key, generation):
+        """Повертає збережені дані дашборду для ключа й покоління або None."""
+        self.env.cr.execute("""
+            SELECT payload
+              FROM smartlogger_dashboard_cache
+             WHERE key = %s
+               AND generation = %s
+               AND computed_at > (now() AT TIME ZONE 'UTC') - %s * interval '1 second'
+        """, [key, generation, self._get_ttl_seconds()])
+        row = self.env.cr.fetchone()
+        if not row or not row[0]:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return None
+
+    @api.model
+    def _store(self, key, generation, data):
+        """Зберігає дані дашборду та видаляє записи попередніх поколінь."""
+        self.env.cr.execute("""
+            INSERT INTO smartlogger_dashboard_cache
+                   (key, generation, payload, computed_at, create_uid, create_date, write_uid, write_date)
+            VALUES (%s, %s, %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC')
+            ON CONFLICT (key) DO UPDATE
+               SET generation = EXCLUDED.generation,
+                   payload = EXCLUDED.payload,
+                   computed_at = EXCLUDED.computed_at,
+                   write_date = EXCLUDED.write_date
+        """, [key, generation, json.dumps(data, default=str), self.env.uid, self.env.uid])
+        self.env.cr.execute("DELETE FROM smartlogger_dashboard_cache WHERE generation < %s", [generation])
@@ -1,5 +1,32 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from dateutil.relativedelta import relativedelta
+import logging
+import re
+
+_logger = logging.getLogger(__name__)
+
+# Секціонована таблиця KPI та її секції
+KPI_TABLE = 'smartlogger_data'
+KPI_LEGACY_PARTITION = 'smartlogger_data_legacy'
+KPI_DEFAULT_PARTITION = 'smartlogger_data_default'
+
+# Межі секції у виводі pg_get_expr(relpartbound): FROM ('...') TO ('...')
+PARTITION_BOUND_RE = re.compile(r"FROM \((?:'([^']+)'|MINVALUE)\) TO \((?:'([^']+)'|MAXVALUE)\)")
+
+# Джерела потокового експорту KPI: bucket -> (модель, колонка часу, колонки значень)
+EXPORT_SOURCES = {
+    'raw': ('smartlogger.data', 'timestamp', ('current_power', 'daily_energy', 'monthly_energy',
+                                     'yearly_energy', 'lifetime_energy', 'is_backfill')),
+    'hour': ('smartlogger.kpi.hourly', 'period_start', ('sample_count', 'avg_power', 'max_power', 'min_power',
+                                                        'last_daily_energy', 'last_lifetime_energy')),
+    'day': ('smartlogger.kpi.daily', 'period_start', ('sample_count', 'avg_power', 'max_power', 'min_power',
+                                                      'last_daily_energy', 'last_lifetime_energy')),
+    'month': ('smartlogger.kpi.monthly', 'period_start', ('sample_count', 'avg_power', 'max_power', 'min_power',
+                                                          'last_monthly_energy', 'last_lifetime_energy')),
+}
+
 
 class SmartLoggerData(models.Model):
     _name = 'smartlogger.data'
@@ -13,7 +40,285 @@ class SmartLoggerData(models.Model):
     monthly_energy = fields.Float('Місячна енергія (кВт·год)')
     yearly_energy = fields.Float('Річна енергія (кВт·год)')
     lifetime_energy = fields.Float('Загальна енергія (кВт·год)')
+    is_backfill = fields.Boolean('Дозавантажено', default=False,
+                                 help="Година з getKpiStationHour: потужність - середня за годину "
+                                      "(енергія години), а не миттєве значення.")
 
     _sql_constraints = [
         ('station_timestamp_unique', 'unique(station_id, timestamp)', 'Запис KPI для цієї станції та часу вже існує!'),
-    ]
\ No newline at end of file
+    ]
+
+    @api.model
+    def _get_export_model(self, bucket='raw'):
+        """Модель, з якої читає експорт KPI інтервалу bucket (для перевірки прав доступу)."""
+        if bucket not in EXPORT_SOURCES:
+            raise UserError(_("Невідомий інтервал експорту: %s") % bucket)
+        return self.env[EXPORT_SOURCES[bucket][0]]
+
+    @api.model
+    def _get_export_query(self, bucket='raw', station_ids=None, date_from=None, date_to=None):
+        """SQL потокового експорту KPI: (назви колонок, запит, параметри).
+
+        bucket - сирі дані ('raw') або рівень зведень ('hour', 'day', 'month').
+        station_ids - дозволені станції (None - усі, порожній список - жодної):
+        запит минає правила записів, тому їх застосовує викликач.
+        Сирі рядки - точки зміни значень, тому мають колонку valid_until.
+        Запит виконується серверним курсором контролера експорту, тому
+        результат не матеріалізується в пам'яті воркера.
+        """
+        table = self._get_export_model(bucket)._table
+        time_column, value_columns = EXPORT_SOURCES[bucket][1:]
+
+        conditions = []
+        params = []
+        if station_ids is not None:
+            if station_ids:
+                conditions.append("k.station_id IN %s")
+                params.append(tuple(station_ids))
+            else:
+                conditions.append("FALSE")
+        if date_from:
+            conditions.append(f'k."{time_column}" >= %s')
+            params.append(date_from)
+        if date_to:
+            conditions.append(f'k."{time_column}" < %s')
+            params.append(date_to)
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+        columns = [time_column, 'station_code', 'station_name'] + list(value_columns)
+        select_extra = ''
+        if bucket == 'raw':
+            # Незмінені зразки не записуються (skip_unchanged_samples): рядок діє
+            # до наступної зміни станції, а останній - до її останньої синхронізації
+            columns.append('valid_until')
+            select_extra = f""",
+                   COALESCE((SELECT MIN(n."timestamp")
+                               FROM {table} n
+                              WHERE n.station_id = k.station_id
+                                AND n."timestamp" > k."timestamp"), s.last_sync)"""
+        query = f"""
+            SELECT k."{time_column}", s.station_code, s.name, {', '.join('k.' + c for c in value_columns)}{select_extra}
+              FROM {table} k
+              JOIN smartlogger_station s ON s.id = k.station_id
+              {where}
+             ORDER BY k."{time_column}", k.station_id
+        """
+        return columns, query, params
+
+    # --- Секціонування таблиці KPI за місяцями (huawei.fusionsolar.kpi_partitioning) ---
+
+    @api.model
+    def _is_partitioning_enabled(self):
+        """Чи увімкнено секціонування таблиці KPI в налаштуваннях."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return IrConfigParameter.get_param('huawei.fusionsolar.kpi_partitioning', 'false') == 'true'
+
+    @api.model
+    def _is_partitioned(self):
+        """Чи є таблиця KPI секціонованою (relkind 'p')."""
+        self.env.cr.execute("SELECT relkind FROM pg_class WHERE relname = %s", [KPI_TABLE])
+        row = self.env.cr.fetchone()
+        return bool(row) and row[0] == 'p'
+
+    @api.model
+    def maintain_partitions(self):
+        """Обслуговування секцій KPI (cron).
+
+        При першому запуску з увімкненим kpi_partitioning звичайна таблиця
+        перетворюється на секціоновану, далі щоразу наперед створюються
+        місячні секції на kpi_partition_months_ahead місяців (і після
+        вимкнення параметра, поки таблиця залишається секціонованою).
+        """
+        if not self._is_partitioned():
+            if not self._is_partitioning_enabled():
+                return 0
+            self._convert_to_partitioned()
+
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        months_ahead = int(IrConfigParameter.get_param('huawei.fusionsolar.kpi_partition_months_ahead', '3'))
+        return self._create_future_partitions(months_ahead)
+
+    @api.model
+    def _convert_to_partitioned(self):
+        """Перетворює smartlogger_data на таблицю, секціоновану за місяцями timestamp.
+
+        Наявні дані не копіюються: стара таблиця підключається як секція
+        smartlogger_data_legacy з діапазоном до початку наступного місяця.
+        Первинний ключ стає (id, timestamp), бо ключ секціонування має
+        входити до всіх унікальних обмежень.
+        """
+        cr = self.env.cr
+        _logger.info("Перетворення таблиці %s на секціоновану за місяцями", KPI_TABLE)
+
+        cr.execute(f"LOCK TABLE {KPI_TABLE} IN ACCESS EXCLUSIVE MODE")
+        cr.execute(f"""
+            SELECT date_trunc('month', COALESCE(MAX("timestamp"), now() AT TIME ZONE 'UTC')) + interval '1 month'
+              FROM {KPI_TABLE}
+        """)
+        legacy_upper = cr.fetchone()[0]
+
+        cr.execute("SELECT pg_get_serial_sequence(%s, 'id')", [KPI_TABLE])
+        sequence = cr.fetchone()[0]
+
+        cr.execute("""
+            SELECT conname, contype, pg_get_constraintdef(oid)
+              FROM pg_constraint
+             WHERE conrelid = %s::regclass
+        """, [KPI_TABLE])
+        constraints = cr.fetchall()
+
+        cr.execute("""
+            SELECT i.indexname, i.indexdef
+              FROM pg_indexes i
+             WHERE i.tablename = %s
+               AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)
+        """, [KPI_TABLE])
+        indexes = cr.fetchall()
+
+        # Стара таблиця та її індекси/обмеження отримують імена з префіксом legacy
+        cr.execute(f"ALTER TABLE {KPI_TABLE} RENAME TO {KPI_LEGACY_PARTITION}")
+        for conname, contype, definition in constraints:
+            if contype == 'f':
+                # Зовнішні ключі секція успадкує від батьківської таблиці
+                cr.execute(f'ALTER TABLE {KPI_LEGACY_PARTITION} DROP CONSTRAINT "{conname}"')
+            else:
+                cr.execute(f'ALTER TABLE {KPI_LEGACY_PARTITION} RENAME CONSTRAINT "{conname}" TO "{self._legacy_name(conname)}"')
+        for indexname, indexdef in indexes:
+            cr.execute(f'ALTER INDEX "{indexname}" RENAME TO "{self._legacy_name(indexname)}"')
+
+        cr.execute(f"""
+            CREATE TABLE {KPI_TABLE} (LIKE {KPI_LEGACY_PARTITION} INCLUDING DEFAULTS)
+            PARTITION BY RANGE ("timestamp")
+        """)
+        if sequence:
+            cr.execute(f"ALTER SEQUENCE {sequence} OWNED BY {KPI_TABLE}.id")
+        cr.execute(f'ALTER TABLE {KPI_TABLE} ADD CONSTRAINT {KPI_TABLE}_pkey PRIMARY KEY (id, "timestamp")')
+        cr.execute(f"""
+            ALTER TABLE {KPI_TABLE}
+              ADD CONSTRAINT {KPI_TABLE}_station_timestamp_unique UNIQUE (station_id, "timestamp")
+        """)
+        # Визначення для ORM: інакше оновлення модуля перестворить обмеження
+        cr.execute(f"""
+            COMMENT ON CONSTRAINT {KPI_TABLE}_station_timestamp_unique ON {KPI_TABLE}
+            IS 'unique(station_id, timestamp)'
+        """)
+        for conname, contype, definition in constraints:
+            if contype == 'f':
+                cr.execute(f'ALTER TABLE {KPI_TABLE} ADD CONSTRAINT "{conname}" {definition}')
+        for indexname, indexdef in indexes:
+            cr.execute(indexdef)
+
+        cr.execute(f"""
+            ALTER TABLE {KPI_TABLE} ATTACH PARTITION {KPI_LEGACY_PARTITION}
+            FOR VALUES FROM (MINVALUE) TO (%s)
+        """, [legacy_upper])
+        cr.execute(f"CREATE TABLE {KPI_DEFAULT_PARTITION} PARTITION OF {KPI_TABLE} DEFAULT")
+
+        _logger.info("Таблиця %s секціонована: наявні дані в секції %s (до %s)",
+                     KPI_TABLE, KPI_LEGACY_PARTITION, legacy_upper)
+
+    @api.model
+    def _legacy_name(self, name):
+        """Ім'я індексу/обмеження старої таблиці (не довше 63 символів)."""
+        if name.startswith(KPI_TABLE):
+            name = name[len(KPI_TABLE):]
+        return (KPI_LEGACY_PARTITION + name)[:63]
+
+    @api.model
+    def _get_range_partitions(self):
+        """Діапазонні секції таблиці KPI: список (ім'я, нижня межа, верхня межа).
+
+        None замість межі означає MINVALUE/MAXVALUE. Секція DEFAULT не входить.
+        """
+        self.env.cr.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+             WHERE i.inhparent = %s::regclass
+        """, [KPI_TABLE])
+        partitions = []
+        for name, bound in self.env.cr.fetchall():
+            match = PARTITION_BOUND_RE.search(bound or '')
+            if not match:
+                continue
+            lower, upper = match.groups()
+            partitions.append((
+                name,
+                fields.Datetime.to_datetime(lower[:19]) if lower else None,
+                fields.Datetime.to_datetime(upper[:19]) if upper else None,
+            ))
+        return partitions
+
+    @api.model
+    def _create_future_partitions(self, months_ahead):
+        """Створює місячні секції від кінця останньої секції до now + months_ahead місяців."""
+        partitions = self._get_range_partitions()
+        month_start = fields.Datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        upper_bounds = [upper for name, lower, upper in partitions if upper]
+        if upper_bounds:
+            month_start = max(month_start, max(upper_bounds))
+        target = month_start.replace(day=1) + relativedelta(months=months_ahead + 1)
+
+        created = 0
+        while month_start < target:
+            next_month = month_start + relativedelta(months=1)
+            name = f"{KPI_TABLE}_p{month_start.strftime('%Y%m')}"
+            self.env.cr.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name} PARTITION OF {KPI_TABLE}
+                FOR VALUES FROM (%s) TO (%s)
+            """, [month_start, next_month])
+            created += 1
+            month_start = next_month
+
+        if created:
+            _logger.info("Створено %d нових секцій KPI (до %s)", created, target)
+        return created
+
+    @api.model
+    def _drop_expired_partitions(self, cutoff_date):
+        """Від'єднує та видаляє секції KPI, повністю старші за cutoff_date.
+
+        Сирі рядки - точки зміни значень, тому останній рядок станції перед
+        cutoff_date (значення, що діє на початку терміну зберігання) не
+        втрачається: якщо до cutoff_date у новіших секціях рядків станції
+        немає, його копія переноситься на верхню межу секції.
+        Повертає приблизну кількість видалених рядків (за статистикою pg_class).
+        """
+        if not self._is_partitioned():
+            return 0
+
+        expired = sorted((partition for partition in self._get_range_partitions()
+                          if partition[2] is not None and partition[2] <= cutoff_date),
+                         key=lambda partition: partition[2])
+        dropped_rows = 0
+        for name, lower, upper in expired:
+            self.env.cr.execute(f"""
+                INSERT INTO {KPI_TABLE}
+                       (station_id, "timestamp", current_power, daily_energy, monthly_energy,
+                        yearly_energy, lifetime_energy, is_backfill,
+                        create_uid, create_date, write_uid, write_date)
+                SELECT DISTINCT ON (p.station_id)
+                       p.station_id, %s, p.current_power, p.daily_energy, p.monthly_energy,
+                       p.yearly_energy, p.lifetime_energy, p.is_backfill,
+                       p.create_uid, p.create_date, p.write_uid, p.write_date
+                  FROM {name} p
+                 WHERE NOT EXISTS (SELECT 1
+                                     FROM {KPI_TABLE} n
+                                    WHERE n.station_id = p.station_id
+                                      AND n."timestamp" >= %s
+                                      AND n."timestamp" <= %s)
+                 ORDER BY p.station_id, p."timestamp" DESC
+                ON CONFLICT (station_id, "timestamp") DO NOTHING
+            """, [upper, upper, cutoff_date])
+            self.env.cr.execute("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE relname = %s", [name])
+            dropped_rows += self.env.cr.fetchone()[0]
+            self.env.cr.execute(f"ALTER TABLE {KPI_TABLE} DETACH PARTITION {name}")
+            self.env.cr.execute(f"DROP TABLE {name}")
+            _logger.info("Видалено секцію KPI %s (дані до %s)", name, upper)
+
+        if dropped_rows:
+            if hasattr(self, 'invalidate_model'):
+                self.invalidate_model()
+            else:
+                self.invalidate_cache()
+        return dropped_rows
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_device.py
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# devTypeId інвертора у FusionSolar
+INVERTER_DEV_TYPE_ID = 1
+
+# Ліміт FusionSolar: кодів станцій у getDevList / ідентифікаторів у getDevRealKpi на один запит
+DEV_API_BATCH_SIZE = 100
+
+# Поля потужності інвертора в dataItemMap getDevRealKpi (в порядку пріоритету)
+DEVICE_POWER_FIELDS = ('active_power', 'activePower', 'real_power', 'realPower',
+                       'power', 'current_power', 'instant_power')
+
+
+class SmartLoggerDevice(models.Model):
+    _name = 'smartlogger.device'
+    _description = 'Пристрій SmartLogger'
+    _order = 'station_id, name'
+
+    name = fields.Char('Назва пристрою', required=True)
+    dev_id = fields.Char('ID пристрою', required=True, index=True,
+                         help="Ідентифікатор пристрою (devId) у FusionSolar.")
+    station_id = fields.Many2one('smartlogger.station', string='Станція', required=True,
+                                 ondelete='cascade', index=True)
+    dev_type_id = fields.Integer('Тип пристрою', index=True,
+                                 help="devTypeId у FusionSolar (1 - інвертор).")
+    esn_code = fields.Char('Серійний номер (ESN)')
+    dev_model = fields.Char('Модель')
+    software_version = fields.Char('Версія ПЗ')
+    active = fields.Boolean('Активний', default=True,
+                            help="Пристрої, яких більше немає в getDevList, архівуються.")
+    last_refresh = fields.Datetime('Оновлено з FusionSolar', readonly=True)
+
+    _sql_constraints = [
+        ('dev_id_unique', 'unique(dev_id)', 'Пристрій з таким ID вже існує!'),
+    ]
+
+    @api.model
+    def refresh_device_registry(self):
+        """Оновлює реєстр пристроїв усіх станцій (cron, рідкісний розклад).
+
+        getDevList запитується пакетами до 100 кодів станцій на запит.
+        """
+        Station = self.env['smartlogger.station']
+        Station._check_api_blocked_status()
+        base_url, username, password, batch_size, request_delay = Station._get_fusionsolar_api_credentials()
+
+        session = Station._open_api_session(base_url, username, password)
+        try:
+            stats = self._refresh_devices(session, base_url, Station.search([]))
+        finally:
+            Station._close_api_session(session)
+
+        _logger.info("Реєстр пристроїв оновлено: %d станцій, %d нових, %d змінених, %d архівовано",
+                     stats['stations'], stats['created'], stats['updated'], stats['archived'])
+        return stats
+
+    @api.model
+    def collect_device_history(self):
+        """Збирає KPI всіх активних інверторів у smartlogger.device.data (cron).
+
+        Інвертори опитуються пакетами по 100 devIds на запит getDevRealKpi,
+        кожна порція відповідей записується одним multi-row INSERT. З нічним
+        режимом (night_sync_interval) інвертори станцій, де сонце під
+        горизонтом, не опитуються.
+        """
+        DeviceData = self.env['smartlogger.device.data']
+        if not DeviceData._is_history_enabled():
+            _logger.info("Збір історії пристроїв вимкнено в конфігурації")
+            return {'rows': 0, 'seconds': 0.0}
+
+        Station = self.env['smartlogger.station']
+        Station._check_api_blocked_status()
+        base_url, username, password, batch_size, request_delay = Station._get_fusionsolar_api_credentials()
+
+        inverters = self.search([('dev_type_id', '=', INVERTER_DEV_TYPE_ID)], order='id')
+        stats = {'rows': 0, 'seconds': 0.0}
+        timestamp = fields.Datetime.now()
+        if Station._get_night_sync_interval():
+            night_ids = {station.id for station in inverters.mapped('station_id')
+                         if not station._is_daylight(timestamp)}
+            if night_ids:
+                inverters = inverters.filtered(lambda device: device.station_id.id not in night_ids)
+                _logger.info("Історія пристроїв: %d станцій пропущено (ніч)", len(night_ids))
+        if not inverters:
+            return stats
+
+        session = Station._open_api_session(base_url, username, password)
+        try:
+            chunk_size = DEV_API_BATCH_SIZE * 10
+            for i in range(0, len(inverters), chunk_size):
+                chunk = inverters[i:i + chunk_size]
+                kpi_by_dev_id = self._fetch_inverter_kpi(session, base_url, chunk)
+                chunk_stats = DeviceData._ingest_device_kpi(chunk, kpi_by_dev_id, timestamp)
+                stats['rows'] += chunk_stats['rows']
+                stats['seconds'] += chunk_stats['seconds']
+        finally:
+            Station._close_api_session(session)
+
+        _logger.info("Історія пристроїв: %d рядків для %d інверторів (%.1f рядків/с)",
+                     stats['rows'], len(inverters), Station._rows_per_second(stats['rows'], stats['seconds']))
+        return stats
+
+    @api.model
+    def _refresh_devices(self, session, base_url, stations):
+        """Оновлює пристрої вказаних станцій з getDevList (до 100 станцій на запит)."""
+        stats = {'stations': 0, 'created': 0, 'updated': 0, 'archived': 0}
+        for i in range(0, len(stations), DEV_API_BATCH_SIZE):
+            chunk = stations[i:i + DEV_API_BATCH_SIZE]
+            try:
+                payload = {"stationCodes": ",".join(chunk.mapped('station_code'))}
+                data = self.env['smartlogger.station']._api_call(session, base_url, 'getDevList', payload)
+            except Exception as e:
+                _logger.warning(f"Помилка отримання списку пристроїв: {str(e)}")
+                continue
+
+            if not data or not data.get('success'):
+                _logger.warning(f"Помилка отримання списку пристроїв: {data.get('message') if data else 'Немає відповіді'}")
+                continue
+
+            self._upsert_devices(chunk, data.get('data') or [], stats)
+            stats['stations'] += len(chunk)
+        return stats
+
+    @api.model
+    def _upsert_devices(self, stations, devices_data, stats):
+        """Записує пристрої станцій пакету: створює нові, оновлює змінені, архівує зниклі."""
+        now = fields.Datetime.now()
+        station_by_code = {station.station_code: station.id for station in stations}
+        returned_ids = [str(device_data['id']) for device_data in devices_data if device_data.get('id') not in (None, '')]
+        # Також пристрої, перенесені з інших станцій (dev_id унікальний)
+        existing = {
+            device.dev_id: device
+            for device in self.with_context(active_test=False).search([
+                '|', ('station_id', 'in', stations.ids), ('dev_id', 'in', returned_ids),
+            ])
+        }
+
+        seen_ids = set()
+        to_create = []
+        for device_data in devices_data:
+            station_id = station_by_code.get(device_data.get('stationCode'))
+            dev_id = device_data.get('id')
+            if not station_id or dev_id in (None, ''):
+                continue
+            dev_id = str(dev_id)
+            if dev_id in seen_ids:
+                continue
+            seen_ids.add(dev_id)
+
+            values = {
+                'name': device_data.get('devName') or dev_id,
+                'station_id': station_id,
+                'dev_type_id': int(device_data.get('devTypeId') or 0),
+                'esn_code': device_data.get('esnCode') or False,
+                'dev_model': device_data.get('model') or False,
+                'software_version': device_data.get('softwareVersion') or False,
+                'active': True,
+            }
+            device = existing.get(dev_id)
+            if device is None:
+                to_create.append(dict(values, dev_id=dev_id, last_refresh=now))
+                continue
+
+            changes = {
+                name: value for name, value in values.items()
+                if name != 'station_id' and (device[name] or False) != value
+            }
+            if device.station_id.id != station_id:
+                changes['station_id'] = station_id
+            if changes:
+                device.write(changes)
+                stats['updated'] += 1
+
+        if to_create:
+            self.create(to_create)
+            stats['created'] += len(to_create)
+
+        # Пристрої, яких немає у відповіді, більше не опитуються
+        missing = self.browse([device.id for dev_id, device in existing.items()
+                               if dev_id not in seen_ids and device.active
+                               and device.station_id.id in station_by_code.values()])
+        if missing:
+            missing.write({'active': False})
+            stats['archived'] += len(missing)
+
+        # Час оновлення реєстру - одним запитом для всього пакету
+        self.env.cr.execute("""
+            UPDATE smartlogger_device SET last_refresh = %s WHERE station_id IN %s
+        """, [now, tuple(stations.ids)])
+        self.env.cr.execute("""
+            UPDATE smartlogger_station SET devices_refreshed_at = %s WHERE id IN %s
+        """, [now, tuple(stations.ids)])
+        Station = self.env['smartlogger.station']
+        Station._invalidate_station_cache(self.browse([device.id for device in existing.values()]), ['last_refresh'])
+        Station._invalidate_station_cache(stations, ['devices_refreshed_at'])
+
+    @api.model
+    def _extract_device_power(self, device_kpi):
+        """Повертає активну потужність інвертора з dataItemMap (0.0, якщо немає)."""
+        for field_name in DEVICE_POWER_FIELDS:
+            if field_name in device_kpi:
+                try:
+                    power_value = float(device_kpi[field_name])
+                except (ValueError, TypeError):
+                    continue
+                if power_value > 0:
+                    return power_value
+        return 0.0
+
+    @api.model
+    def _fetch_inverter_kpi(self, session, base_url, devices):
+        """Запитує getDevRealKpi інверторів пакетами до 100 devIds на запит.
+
+        Повертає словник dev_id -> dataItemMap для пристроїв, що відповіли.
+        """
+        kpi_by_dev_id = {}
+        dev_ids = devices.mapped('dev_id')
+        Station = self.env['smartlogger.station']
+        for i in range(0, len(dev_ids), DEV_API_BATCH_SIZE):
+            chunk = dev_ids[i:i + DEV_API_BATCH_SIZE]
+            try:
+                payload = {"devIds": ",".join(chunk), "devTypeId": str(INVERTER_DEV_TYPE_ID)}
+                data = Station._api_call(session, base_url, 'getDevRealKpi', payload)
+            except Exception as e:
+                _logger.warning(f"Помилка пакетного запиту KPI пристроїв: {str(e)}")
+                continue
+
+            if not data or not data.get('success'):
+                _logger.warning(f"Помилка пакетного запиту KPI пристроїв: {data.get('failCode') if data else 'Немає відповіді'}")
+                continue
+
+            for item in data.get('data') or []:
+                if item.get('devId') is not None:
+                    kpi_by_dev_id[str(item['devId'])] = item.get('dataItemMap') or {}
+        return kpi_by_dev_id
+
+    @api.model
+    def _get_stations_power(self, session, base_url, stations):
+        """Сумарна потужність інверторів станцій: station_id -> кВт.
+
+        Пристрої беруться з реєстру (станції, для яких реєстр ще не
+        заповнювався, оновлюються одним getDevList), а KPI інверторів усіх
+        станцій запитуються спільними пакетами getDevRealKpi.
+        """
+        never_refreshed = stations.filtered(lambda s: not s.devices_refreshed_at)
+        if never_refreshed:
+            self._refresh_devices(session, base_url, never_refreshed)
+
+        inverters = self.search([
+            ('station_id', 'in', stations.ids),
+            ('dev_type_id', '=', INVERTER_DEV_TYPE_ID),
+        ])
+        if not inverters:
+            return {}
+
+        kpi_by_dev_id = self._fetch_inverter_kpi(session, base_url, inverters)
+
+        # Відповіді, вже отримані для потужності станцій, зберігаються в історію пристроїв
+        DeviceData = self.env['smartlogger.device.data']
+        if DeviceData._is_history_enabled():
+            DeviceData._ingest_device_kpi(inverters, kpi_by_dev_id)
+
+        power_by_station = {}
+        for inverter in inverters:
+            device_kpi = kpi_by_dev_id.get(inverter.dev_id)
+            if device_kpi is None:
+                continue
+            station_id = inverter.station_id.id
+            power_by_station[station_id] = power_by_station.get(station_id, 0.0) + self._extract_device_power(device_kpi)
+
+        _logger.info("Потужність пристроїв: %d інверторів %d станцій за %d запитів getDevRealKpi",
+                     len(inverters), len(power_by_station),
+                     (len(inverters) + DEV_API_BATCH_SIZE - 1) // DEV_API_BATCH_SIZE)
+        return power_by_station
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_device_data.py
+
+from odoo import models, fields, api
+import logging
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Рядків в одному multi-row INSERT
+DEVICE_DATA_INSERT_CHUNK = 1000
+
+# Поля часового ряду -> ключі dataItemMap getDevRealKpi інвертора
+DEVICE_DATA_FIELDS = (
+    ('active_power', ('active_power', 'activePower')),
+    ('day_energy', ('day_cap', 'dayCap')),
+    ('total_energy', ('total_cap', 'totalCap')),
+    ('efficiency', ('efficiency',)),
+    ('temperature', ('temperature',)),
+)
+
+
+class SmartLoggerDeviceData(models.Model):
+    _name = 'smartlogger.device.data'
+    _description = 'Історичні дані пристроїв SmartLogger'
+    _order = 'timestamp DESC'
+
+    device_id = fields.Many2one('smartlogger.device', string='Пристрій', required=True, ondelete='cascade')
+    station_id = fields.Many2one('smartlogger.station', string='Станція', required=True,
+                                 ondelete='cascade', index=True)
+    timestamp = fields.Datetime('Час запису', default=fields.Datetime.now, required=True, index=True)
+    active_power = fields.Float('Активна потужність (кВт)')
+    day_energy = fields.Float('Добова енергія (кВт·год)')
+    total_energy = fields.Float('Загальна енергія (кВт·год)')
+    efficiency = fields.Float('ККД інвертора (%)')
+    temperature = fields.Float('Температура (°C)')
+    run_state = fields.Integer('Стан роботи', help="run_state з FusionSolar (1 - підключено до мережі).")
+
+    _sql_constraints = [
+        ('device_timestamp_unique', 'unique(device_id, timestamp)', 'Запис для цього пристрою та часу вже існує!'),
+    ]
+
+    @api.model
+    def _is_history_enabled(self):
+        """Чи увімкнено збір історії пристроїв у налаштуваннях."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return IrConfigParameter.get_param('huawei.fusionsolar.collect_device_history', 'false') == 'true'
+
+    @api.model
+    def _ingest_device_kpi(self, devices, kpi_by_dev_id, timestamp=None):
+        """Записує KPI інверторів з відповідей getDevRealKpi multi-row INSERT-ами.
+
+        Повертає статистику запису: кількість рядків і тривалість.
+        """
+        start_time = time.monotonic()
+        timestamp = timestamp or fields.Datetime.now()
+        Station = self.env['smartlogger.station']
+
+        rows = []
+        for device in devices:
+            device_kpi = kpi_by_dev_id.get(device.dev_id)
+            if device_kpi is None:
+                continue
+            row = [device.id, device.station_id.id, timestamp]
+            for field_name, kpi_keys in DEVICE_DATA_FIELDS:
+                row.append(Station._safe_float_extract(device_kpi, kpi_keys))
+            row.append(int(Station._safe_float_extract(device_kpi, ('run_state', 'inverter_state'))))
+            rows.append(row)
+
+        if not rows:
+            return {'rows': 0, 'seconds': 0.0}
+
+        columns = ['device_id', 'station_id', 'timestamp'] + [name for name, keys in DEVICE_DATA_FIELDS] + ['run_state']
+        placeholders = '(' + ', '.join(['%s'] * (len(columns) + 4)) + ')'
+        for i in range(0, len(rows), DEVICE_DATA_INSERT_CHUNK):
+            chunk = rows[i:i + DEVICE_DATA_INSERT_CHUNK]
+            params = []
+            for row in chunk:
+                params.extend(row + [self.env.uid, timestamp, self.env.uid, timestamp])
+            self.env.cr.execute(f"""
+                INSERT INTO smartlogger_device_data
+                       ({', '.join(columns)}, create_uid, create_date, write_uid, write_date)
+                VALUES {', '.join([placeholders] * len(chunk))}
+                ON CONFLICT (device_id, timestamp) DO NOTHING
+            """, params)
+
+        seconds = time.monotonic() - start_time
+        _logger.info("Дані пристроїв записано: %d рядків за %.3f с (%.1f рядків/с)",
+                     len(rows), seconds, Station._rows_per_second(len(rows), seconds))
+        return {'rows': len(rows), 'seconds': seconds}
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_rate_limiter.py
+
+import threading
+import time
+
+# Лімітери рівня процесу: спільні для всіх потоків і синхронізацій однієї БД
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucket(object):
+    """Потокобезпечний token bucket: не більше rate запитів за секунду.
+
+    capacity - кількість запитів, які можна виконати одразу після паузи.
+    rate <= 0 вимикає обмеження.
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """Блокує поточний потік, доки не з'явиться дозвіл на запит."""
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AimdPacer(TokenBucket):
+    """Token bucket з адаптивною (AIMD) швидкістю.
+
+    Кожен успішний запит додає increase до швидкості (адитивне зростання),
+    відповідь про перевищення частоти множить її на decrease_factor
+    (мультиплікативне зменшення). Швидкість тримається в [min_rate, max_rate].
+    """
+
+    def __init__(self, rate, min_rate, max_rate, increase=0.02, decrease_factor=0.5):
+        super(AimdPacer, self).__init__(min(max(rate, min_rate), max_rate))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+
+    def configure_bounds(self, min_rate, max_rate, increase, decrease_factor):
+        """Оновлює межі та крок адаптації з налаштувань."""
+        with self._lock:
+            self.min_rate = min_rate
+            self.max_rate = max_rate
+            self.increase = increase
+            self.decrease_factor = decrease_factor
+            self.rate = min(max(self.rate, min_rate), max_rate)
+
+    def on_success(self):
+        """Адитивне зростання після успішного запиту."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        """Мультиплікативне зменшення після відповіді про перевищення частоти."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            # Запас дозволів скидається: наступний запит чекає повний інтервал
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+
+def get_pacer(key, initial_rate, min_rate, max_rate, increase=0.02, decrease_factor=0.5):
+    """Повертає спільний для процесу AIMD пейсер за ключем.
+
+    initial_rate використовується лише при створенні: далі пейсер
+    зберігає вивчену швидкість.
+    """
+    with _limiters_lock:
+        pacer = _limiters.get(key)
+        if pacer is None:
+            pacer = _limiters[key] = AimdPacer(initial_rate, min_rate, max_rate, increase, decrease_factor)
+        else:
+            pacer.configure_bounds(min_rate, max_rate, increase, decrease_factor)
+        return pacer
+
+
+def iter_pacers(prefix):
+    """Повертає пари (ключ, пейсер) для ключів-кортежів, що починаються з prefix."""
+    with _limiters_lock:
+        return [(key, pacer) for key, pacer in _limiters.items()
+                if isinstance(key, tuple) and key[:len(prefix)] == prefix]
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_rollup.py
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Моделі зведених KPI, що оновлюються при кожному записі пакету
+ROLLUP_MODELS = ('smartlogger.kpi.hourly', 'smartlogger.kpi.daily', 'smartlogger.kpi.monthly')
+
+# Лічильники енергії: останнє значення за період
+ROLLUP_ENERGY_FIELDS = ('daily_energy', 'monthly_energy', 'yearly_energy', 'lifetime_energy')
+
+
+class SmartLoggerKpiRollupMixin(models.AbstractModel):
+    _name = 'smartlogger.kpi.rollup.mixin'
+    _description = 'Зведені KPI станції за період'
+    _order = 'period_start DESC'
+
+    # Одиниця date_trunc періоду та параметр терміну зберігання (днів, 0 - назавжди)
+    _rollup_unit = None
+    _rollup_retention_param = None
+    _rollup_retention_default = '0'
+
+    station_id = fields.Many2one('smartlogger.station', string='Станція', required=True, ondelete='cascade')
+    period_start = fields.Datetime('Початок періоду', required=True, index=True)
+    sample_count = fields.Integer('Кількість вимірів', default=0)
+    sum_power = fields.Float('Сума потужності (кВт)')
+    avg_power = fields.Float('Середня потужність (кВт)')
+    max_power = fields.Float('Максимальна потужність (кВт)')
+    min_power = fields.Float('Мінімальна потужність (кВт)')
+    last_sample_at = fields.Datetime('Останній вимір')
+    last_daily_energy = fields.Float('Добова енергія (кВт·год)')
+    last_monthly_energy = fields.Float('Місячна енергія (кВт·год)')
+    last_yearly_energy = fields.Float('Річна енергія (кВт·год)')
+    last_lifetime_energy = fields.Float('Загальна енергія (кВт·год)')
+
+    _sql_constraints = [
+        ('station_period_unique', 'unique(station_id, period_start)', 'Зведення для цієї станції та періоду вже існує!'),
+    ]
+
+    def init(self):
+        """Заповнює порожню таблицю зведень з наявних сирих KPI (встановлення/оновлення модуля)."""
+        if self._abstract or not self._rollup_unit:
+            return
+        self.env.cr.execute(f"SELECT 1 FROM {self._table} LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild_from_raw()
+
+    @api.model
+    def _get_retention_days(self):
+        """Термін зберігання зведень цього рівня (0 - назавжди)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return int(IrConfigParameter.get_param(self._rollup_retention_param, self._rollup_retention_default))
+
+    @api.model
+    def _upsert_samples(self, samples, timestamp):
+        """Інкрементально додає KPI зразки пакету до зведень одним INSERT ... ON CONFLICT.
+
+        Невідомий лічильник енергії (None, напр. у дозавантаженій історії)
+        не перезаписує вже відоме значення періоду. sample['weight'] (за
+        замовчуванням 1) - скільки вимірів представляє зразок: дозавантажена
+        година важить як година живих зразків, щоб не спотворювати середню потужність.
+        """
+        if not samples:
+            return
+
+        # Явні типи: стовпець VALUES лише з NULL інакше отримав би тип text
+        values_sql = ', '.join(['(%s, %s, %s::float8, %s::float8, %s::float8, %s::float8, %s::int)'] * len(samples))
+        params = [self._rollup_unit, self.env.uid, timestamp, self.env.uid, timestamp, timestamp]
+        for sample in samples:
+            params.extend([sample['station_id'], float(sample['current_power'])]
+                          + [float(sample[name]) if sample[name] is not None else None
+                             for name in ROLLUP_ENERGY_FIELDS]
+                          + [sample.get('weight', 1)])
+
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS r
+                   (station_id, period_start, sample_count, sum_power, avg_power, max_power, min_power,
+                    last_sample_at, last_daily_energy, last_monthly_energy, last_yearly_energy,
+                    last_lifetime_energy, create_uid, create_date, write_uid, write_date)
+            SELECT v.station_id, date_trunc(%s, v.ts), v.weight, v.power * v.weight, v.power, v.power, v.power,
+                   v.ts, v.daily, v.monthly, v.yearly, v.lifetime, %s, %s, %s, %s
+              FROM (SELECT station_id, power, daily, monthly, yearly, lifetime, weight, %s::timestamp AS ts
+                      FROM (VALUES {values_sql}) AS s(station_id, power, daily, monthly, yearly, lifetime,
+                                                      weight)) AS v
+            ON CONFLICT (station_id, period_start) DO UPDATE SET
+                   sample_count = r.sample_count + EXCLUDED.sample_count,
+                   sum_power = r.sum_power + EXCLUDED.sum_power,
+                   avg_power = (r.sum_power + EXCLUDED.sum_power) / (r.sample_count + EXCLUDED.sample_count),
+                   max_power = GREATEST(r.max_power, EXCLUDED.max_power),
+                   min_power = LEAST(r.min_power, EXCLUDED.min_power),
+                   last_sample_at = GREATEST(r.last_sample_at, EXCLUDED.last_sample_at),
+                   last_daily_energy = CASE WHEN EXCLUDED.last_sample_at >= r.last_sample_at
+                                            THEN COALESCE(EXCLUDED.last_daily_energy, r.last_daily_energy)
+                                            ELSE COALESCE(r.last_daily_energy, EXCLUDED.last_daily_energy) END,
+                   last_monthly_energy = CASE WHEN EXCLUDED.last_sample_at >= r.last_sample_at
+                                              THEN COALESCE(EXCLUDED.last_monthly_energy, r.last_monthly_energy)
+                                              ELSE COALESCE(r.last_monthly_energy, EXCLUDED.last_monthly_energy) END,
+                   last_yearly_energy = CASE WHEN EXCLUDED.last_sample_at >= r.last_sample_at
+                                             THEN COALESCE(EXCLUDED.last_yearly_energy, r.last_yearly_energy)
+                                             ELSE COALESCE(r.last_yearly_energy, EXCLUDED.last_yearly_energy) END,
+                   last_lifetime_energy = CASE WHEN EXCLUDED.last_sample_at >= r.last_sample_at
+                                               THEN COALESCE(EXCLUDED.last_lifetime_energy, r.last_lifetime_energy)
+                                               ELSE COALESCE(r.last_lifetime_energy, EXCLUDED.last_lifetime_energy) END,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, params)
+
+    @api.model
+    def _rebuild_from_raw(self):
+        """Перераховує зведення цього рівня з сирих даних smartlogger.data одним запитом.
+
+        Дозавантажені години мають ту саму вагу, що й у _upsert_samples.
+        """
+        weight = self.env['smartlogger.station']._get_live_samples_per_hour()
+        self.env.cr.execute(f"""
+            INSERT INTO {self._table} AS r
+                   (station_id, period_start, sample_count, sum_power, avg_power, max_power, min_power,
+                    last_sample_at, last_daily_energy, last_monthly_energy, last_yearly_energy,
+                    last_lifetime_energy, create_uid, create_date, write_uid, write_date)
+            SELECT station_id, period_start, SUM(weight), SUM(current_power * weight),
+                   SUM(current_power * weight) / NULLIF(SUM(weight), 0), MAX(current_power), MIN(current_power), MAX("timestamp"),
+                   (ARRAY_AGG(daily_energy ORDER BY "timestamp" DESC))[1],
+                   (ARRAY_AGG(monthly_energy ORDER BY "timestamp" DESC))[1],
+                   (ARRAY_AGG(yearly_energy ORDER BY "timestamp" DESC))[1],
+                   (ARRAY_AGG(lifetime_energy ORDER BY "timestamp" DESC))[1],
+                   %s, now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC'
+              FROM (SELECT d.*, date_trunc(%s, d."timestamp") AS period_start,
+                           CASE WHEN d.is_backfill THEN %s ELSE 1 END AS weight
+                      FROM smartlogger_data d) AS raw
+             GROUP BY station_id, period_start
+            ON CONFLICT (station_id, period_start) DO UPDATE SET
+                   sample_count = EXCLUDED.sample_count,
+                   sum_power = EXCLUDED.sum_power,
+                   avg_power = EXCLUDED.avg_power,
+                   max_power = EXCLUDED.max_power,
+                   min_power = EXCLUDED.min_power,
+                   last_sample_at = EXCLUDED.last_sample_at,
+                   last_daily_energy = EXCLUDED.last_daily_energy,
+                   last_monthly_energy = EXCLUDED.last_monthly_energy,
+                   last_yearly_energy = EXCLUDED.last_yearly_energy,
+                   last_lifetime_energy = EXCLUDED.last_lifetime_energy,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, [self.env.uid, self.env.uid, self._rollup_unit, weight])
+        _logger.info("Зведення %s перераховано з сирих KPI: %d періодів", self._name, self.env.cr.rowcount)
+
+
+class SmartLoggerKpiHourly(models.Model):
+    _name = 'smartlogger.kpi.hourly'
+    _inherit = 'smartlogger.kpi.rollup.mixin'
+    _description = 'Погодинні KPI станції'
+
+    _rollup_unit = 'hour'
+    _rollup_retention_param = 'huawei.fusionsolar.rollup_hourly_retention_days'
+    _rollup_retention_default = '365'
+
+
+class SmartLoggerKpiDaily(models.Model):
+    _name = 'smartlogger.kpi.daily'
+    _inherit = 'smartlogger.kpi.rollup.mixin'
+    _description = 'Щоденні KPI станції'
+
+    _rollup_unit = 'day'
+    _rollup_retention_param = 'huawei.fusionsolar.rollup_daily_retention_days'
+
+
+class SmartLoggerKpiMonthly(models.Model):
+    _name = 'smartlogger.kpi.monthly'
+    _inherit = 'smartlogger.kpi.rollup.mixin'
+    _description = 'Щомісячні KPI станції'
+
+    _rollup_unit = 'month'
+    _rollup_retention_param = 'huawei.fusionsolar.rollup_monthly_retention_days'
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_solar.py
+
+import math
+
+# Висота сонця (градуси), нижче якої станція вважається "нічною":
+# невеликий запас під горизонтом, щоб не пропускати ранкові сутінки
+SUN_DOWN_ELEVATION = -2.0
+
+
+def solar_elevation(latitude, longitude, when):
+    """Висота сонця над горизонтом у градусах (наближення NOAA, без мережі).
+
+    when - наївний datetime в UTC. Точність близько 0.5°, чого достатньо,
+    щоб відрізнити день від ночі.
+    """
+    hour = when.hour + when.minute / 60.0 + when.second / 3600.0
+    gamma = 2 * math.pi / 365.0 * (when.timetuple().tm_yday - 1 + (hour - 12) / 24.0)
+
+    # Рівняння часу (хвилини) та схилення сонця (радіани)
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * math.cos(gamma) - 0.032077 * math.sin(gamma)
+                                 - 0.014615 * math.cos(2 * gamma) - 0.040849 * math.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * math.cos(gamma) + 0.070257 * math.sin(gamma)
+                   - 0.006758 * math.cos(2 * gamma) + 0.000907 * math.sin(2 * gamma)
+                   - 0.002697 * math.cos(3 * gamma) + 0.00148 * math.sin(3 * gamma))
+
+    # Істинний сонячний час (хвилини) і годинний кут
+    true_solar_time = hour * 60 + equation_of_time + 4 * longitude
+    hour_angle = math.radians(true_solar_time / 4.0 - 180)
+
+    lat = math.radians(latitude)
+    cos_zenith = (math.sin(lat) * math.sin(declination)
+                  + math.cos(lat) * math.cos(declination) * math.cos(hour_angle))
+    return 90.0 - math.degrees(math.acos(max(-1.0, min(1.0, cos_zenith))))
+
+
+def is_sun_up(latitude, longitude, when):
+    """Чи вище сонце за SUN_DOWN_ELEVATION в точці та момент when (UTC)."""
+    return solar_elevation(latitude, longitude, when) > SUN_DOWN_ELEVATION
@@ -4,14 +4,80 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools import float_compare
 import requests
+import hashlib
 import json
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 import time
 
+from .smartlogger_rate_limiter import get_pacer, iter_pacers
+from .smartlogger_rollup import ROLLUP_MODELS
+from .smartlogger_alert import STATUS_ALERT_RULES
+from .smartlogger_solar import is_sun_up
+from .smartlogger_sync_run import get_active_run_stats, activate_run_stats, run_phase
+
 _logger = logging.getLogger(__name__)
 
+# Ключі ir.config_parameter спільного кешу токена FusionSolar
+TOKEN_PARAM = 'huawei.fusionsolar.xsrf_token'
+TOKEN_EXPIRY_PARAM = 'huawei.fusionsolar.xsrf_token_expiry'
+TOKEN_OWNER_PARAM = 'huawei.fusionsolar.xsrf_token_owner'
+
+# Телеметричні поля станції: за замовчуванням пишуться без mail.thread трекінгу,
+# відстеження вмикається для окремих полів параметром tracked_telemetry_fields
+TELEMETRY_FIELDS = ('current_power', 'daily_energy', 'monthly_energy', 'yearly_energy',
+                    'lifetime_energy', 'last_sync')
+
+# Значення KPI зразка, що порівнюються з останніми збереженими для пропуску незмінних зразків
+KPI_SAMPLE_FIELDS = ('current_power', 'daily_energy', 'monthly_energy', 'yearly_energy', 'lifetime_energy')
+
+# failCode, якими FusionSolar повідомляє, що сесія прострочена і потрібен повторний логін
+RELOGIN_FAIL_CODES = (305, 20401)
+
+# failCode перевищення частоти запитів: сигнал для зменшення швидкості пейсера
+THROTTLE_FAIL_CODES = (407, 20429)
+
+# Через скільки секунд без синхронізації дані станції вважаються застарілими
+CONNECTION_OUTDATED_SECONDS = 7200
+
+# Вага статусу в оцінці застарілості планувальника (менше - рідше опитується)
+SYNC_STATUS_WEIGHTS = {
+    'active': 1.0,
+    'error': 0.5,
+    'sync_error': 0.5,
+    'maintenance': 0.25,
+    'inactive': 0.1,
+}
+
+# Умовна застарілість (секунди) станції, що ще не синхронізувалась
+NEVER_SYNCED_STALENESS = 10 ** 9
+
+# Контрольна точка запуску синхронізації (JSON: етап, сторінка, остання станція)
+SYNC_CURSOR_PARAM = 'huawei.fusionsolar.sync_cursor'
+
+# Через скільки годин незавершений запуск не продовжується, а починається спочатку
+SYNC_CURSOR_MAX_AGE_HOURS = 6
+
+# Префікс параметрів із вивченою швидкістю пейсера кожного ендпоінта
+PACER_RATE_PARAM_PREFIX = 'huawei.fusionsolar.pacer_rate.'
+
+# Тривалість одиниці інтервалу ir.cron у хвилинах та інтервал планової
+# синхронізації за замовчуванням (data/cron_data.xml)
+CRON_INTERVAL_MINUTES = {'minutes': 1, 'hours': 60, 'days': 1440, 'weeks': 10080, 'months': 43200}
+DEFAULT_SYNC_INTERVAL_MINUTES = 15
+
+# Скільки запитів пакетів KPI на потік пулу може бути поставлено наперед:
+# після зупинки за дедлайном втрачаються лише вже отримані відповіді вікна
+KPI_FETCH_WINDOW_PER_WORKER = 2
+
+# Повторний логін змінює заголовки та cookies сесії, спільної з потоками пулу
+_session_relogin_lock = threading.Lock()
+
 
 class SmartLoggerStation(models.Model):
     _name = 'smartlogger.station'
@@ -25,20 +91,23 @@ class SmartLoggerStation(models.Model):
     plant_code = fields.Char('Код електростанції', tracking=True,
                              help="Код електростанції (plantCode) - альтернативний ідентифікатор.")
     capacity = fields.Float('Потужність (кВт)', help="Номінальна потужність станції.")
-    current_power = fields.Float('Поточна потужність (кВт)', tracking=True,
+    current_power = fields.Float('Поточна потужність (кВт)',
                                  help="Поточна вироблена потужність станції.")
-    daily_energy = fields.Float('Добова енергія (кВт·год)', tracking=True,
+    daily_energy = fields.Float('Добова енергія (кВт·год)',
                                 help="Загальна вироблена енергія за поточний день.")
-    monthly_energy = fields.Float('Місячна енергія (кВт·год)', tracking=True,
+    monthly_energy = fields.Float('Місячна енергія (кВт·год)',
                                   help="Загальна вироблена енергія за поточний місяць.")
-    yearly_energy = fields.Float('Річна енергія (кВт·год)', tracking=True,
+    yearly_energy = fields.Float('Річна енергія (кВт·год)',
                                  help="Загальна вироблена енергія за поточний рік.")
-    lifetime_energy = fields.Float('Загальна енергія (кВт·год)', tracking=True,
+    lifetime_energy = fields.Float('Загальна енергія (кВт·год)',
                                    help="Загальна вироблена енергія за весь час роботи станції.")
-    last_sync = fields.Datetime('Остання синхронізація', readonly=True, tracking=True)
+    last_sync = fields.Datetime('Остання синхронізація', readonly=True)
 
     # Додаткові поля для множественних станцій
     region = fields.Char('Регіон', help="Регіон розташування станції")
+    latitude = fields.Float('Широта', digits=(10, 6),
+                            help="Координати зі списку станцій FusionSolar; визначають день/ніч для планувальника.")
+    longitude = fields.Float('Довгота', digits=(10, 6))
     api_endpoint = fields.Char('API Endpoint', help="Специфічний endpoint для цієї станції")
     sync_priority = fields.Integer('Пріоритет синхронізації', default=10,
                                    help="Пріоритет синхронізації (1-найвищий, 10-найнижчий)")
@@ -62,16 +131,26 @@ class SmartLoggerStation(models.Model):
     # Поле для зберігання історичних даних
     kpi_data_ids = fields.One2many('smartlogger.data', 'station_id', string='Історичні дані KPI')
 
+    # Реєстр пристроїв станції (оновлюється з getDevList за розкладом)
+    device_ids = fields.One2many('smartlogger.device', 'station_id', string='Пристрої')
+    devices_refreshed_at = fields.Datetime('Реєстр пристроїв оновлено', readonly=True)
+
+    # Контрольна точка дозавантаження історії (smartlogger.backfill): години до неї перевірені
+    backfilled_until = fields.Datetime('Історію перевірено до', readonly=True,
+                                       help="Пропуски історії KPI до цього часу вже дозавантажено з FusionSolar.")
+
     _sql_constraints = [
         ('station_code_unique', 'unique(station_code)', 'Код станції повинен бути унікальним!'),
     ]
 
-    efficiency = fields.Float('Ефективність (%)', compute='_compute_efficiency', store=False)
+    # Зберігаються та індексуються: записує їх SQL оновлення KPI (_ingest_kpi_batch),
+    # а застарілість з'єднання перераховує _refresh_connection_status за розкладом
+    efficiency = fields.Float('Ефективність (%)', compute='_compute_efficiency', store=True, index=True)
     connection_status = fields.Selection([
         ('connected', 'Підключено'),
         ('outdated', 'Застарілі дані'),
         ('never_synced', 'Ніколи не синхронізувалось')
-    ], string='Статус з\'єднання', compute='_compute_connection_status', store=False)
+    ], string='Статус з\'єднання', compute='_compute_connection_status', store=True, index=True)
 
     @api.depends('current_power', 'capacity')
     def _compute_efficiency(self):
@@ -89,11 +168,59 @@ class SmartLoggerStation(models.Model):
         for record in self:
             if not record.last_sync:
                 record.connection_status = 'never_synced'
-            elif (current_time - record.last_sync).total_seconds() > 7200:  # 2 часа
+            elif (current_time - record.last_sync).total_seconds() > CONNECTION_OUTDATED_SECONDS:
                 record.connection_status = 'outdated'
             else:
                 record.connection_status = 'connected'
 
+    @api.model
+    def _refresh_connection_status(self):
+        """Перераховує connection_status усіх станцій одним SQL запитом (cron).
+
+        Оновлюються лише рядки, статус яких змінився з плином часу, а
+        правило stale_sync перевіряється для них і всіх застарілих станцій,
+        щоб затримка у відкритих алертах залишалась актуальною.
+        """
+        self.env.cr.execute("""
+            UPDATE smartlogger_station
+               SET connection_status = new_status
+              FROM (SELECT id AS station_id,
+                           CASE WHEN last_sync IS NULL THEN 'never_synced'
+                                WHEN last_sync < (now() AT TIME ZONE 'UTC') - %s * interval '1 second' THEN 'outdated'
+                                ELSE 'connected' END AS new_status
+                      FROM smartlogger_station) AS computed
+             WHERE id = computed.station_id
+               AND connection_status IS DISTINCT FROM computed.new_status
+            RETURNING id
+        """, [CONNECTION_OUTDATED_SECONDS])
+        changed_ids = [row[0] for row in self.env.cr.fetchall()]
+        changed = self.browse(changed_ids)
+        if changed_ids:
+            self._invalidate_station_cache(changed, ['connection_status'])
+            _logger.info("Статус з'єднання оновлено для %d станцій", len(changed_ids))
+        outdated = self.search([('connection_status', '=', 'outdated')])
+        self.env['smartlogger.alert']._evaluate_stations(changed | outdated, rules=('stale_sync',))
+        return len(changed_ids)
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Алерти статусу перевіряються лише для станцій, статус яких змінено
+        if 'status' in vals and not self.env.context.get('skip_alert_evaluation'):
+            self.env['smartlogger.alert']._evaluate_stations(self, rules=STATUS_ALERT_RULES)
+        return res
+
+    @api.model
+    def _get_tracked_telemetry_fields(self):
+        """Телеметричні поля, для яких у налаштуваннях увімкнено трекінг у чаттері."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        value = IrConfigParameter.get_param('huawei.fusionsolar.tracked_telemetry_fields', '') or ''
+        return [name.strip() for name in value.split(',') if name.strip() in TELEMETRY_FIELDS]
+
+    def _track_get_fields(self):
+        """Додає до відстежуваних полів телеметрію, вибрану в налаштуваннях."""
+        tracked_fields = set(super()._track_get_fields() or ())
+        return tracked_fields | set(self._get_tracked_telemetry_fields())
+
     @api.model
     def _get_fusionsolar_api_credentials(self):
         """Отримує облікові дані FusionSolar API з системних параметрів."""
@@ -198,6 +325,28 @@ class SmartLoggerStation(models.Model):
     def sync_fusionsolar_data(self):
         """
         Синхронізує дані всіх станцій з FusionSolar API з оптимізацією для множественних станцій.
+
+        Кожен запуск записується в журнал smartlogger.sync.run (тривалість
+        етапів, API виклики за ендпоінтами, failCode, записані рядки), а
+        його лічильники (api_calls_made тощо) додаються до результату.
+        """
+        with self.env['smartlogger.sync.run']._track('full') as run_stats:
+            result = self._run_fusionsolar_sync(run_stats)
+            if not result.get('completed'):
+                run_stats.state = 'interrupted'
+        for key, value in run_stats.result_values().items():
+            result.setdefault(key, value)
+        return result
+
+    @api.model
+    def _run_fusionsolar_sync(self, run_stats):
+        """
+        Виконує запуск синхронізації (див. sync_fusionsolar_data).
+
+        Запуск фіксується після кожної сторінки списку станцій та кожного
+        пакету KPI і зберігає контрольну точку (етап, сторінка, остання
+        станція). Запуск, перерваний бюджетом часу sync_time_budget,
+        limit_time_real чи помилкою, наступний виклик продовжує з неї.
         """
         _logger.info("Початок синхронізації даних FusionSolar.")
 
@@ -207,24 +356,91 @@ class SmartLoggerStation(models.Model):
 
             base_url, username, password, batch_size, request_delay = self._get_fusionsolar_api_credentials()
 
-            # Отримуємо або оновлюємо список станцій
-            self._update_station_list(base_url, username, password, request_delay)
+            time_budget = self._get_sync_time_budget()
+            deadline = time.monotonic() + time_budget if time_budget else None
+
+            cursor = self._read_sync_cursor()
+            if cursor:
+                _logger.info("Продовження перерваного запуску від %s: етап %s",
+                             cursor['started_at'], cursor['phase'])
+            else:
+                cursor = {'phase': 'station_list', 'started_at': fields.Datetime.to_string(fields.Datetime.now()),
+                          'page_no': 1, 'last_station_id': None}
 
-            # Синхронізуємо дані станцій пакетами
-            self._sync_stations_batch(base_url, username, password, batch_size, request_delay)
+            # Отримуємо або оновлюємо список станцій
+            list_stats = {'api_calls': 0}
+            if cursor['phase'] == 'station_list':
+                with run_phase('station_list'):
+                    list_stats = self._update_station_list(base_url, username, password,
+                                                           cursor=cursor, deadline=deadline)
+                for counter in ('stations_found', 'stations_created', 'stations_updated'):
+                    run_stats.add(counter, list_stats[counter])
+                if not list_stats['completed']:
+                    return self._interrupted_sync_result(cursor)
+                cursor.update(phase='kpi', last_station_id=None)
+                self._save_sync_cursor(cursor)
+                self._commit_progress()
+
+            # Вночі станції опитуються рідко (night_sync_interval)
+            resting_ids = self._get_night_resting_ids()
+
+            # З бюджетом запитів синхронізуються лише найбільш "застарілі" станції
+            stations = None
+            tick_budget = self._get_sync_tick_budget()
+            if tick_budget > 0:
+                kpi_calls = tick_budget - list_stats.get('api_calls', 0)
+                stations = self._select_stations_for_tick(max(kpi_calls, 0) * batch_size, exclude_ids=resting_ids)
+                _logger.info("Планувальник: бюджет %d запитів, %d на список станцій, до синхронізації %d станцій",
+                             tick_budget, list_stats.get('api_calls', 0), len(stations))
+            elif resting_ids:
+                stations = self.search([('id', 'not in', resting_ids)], order='sync_priority ASC, id ASC')
+            if resting_ids:
+                _logger.info("Планувальник: %d станцій пропущено (ніч)", len(resting_ids))
+            if stations is not None:
+                run_stats.add('stations_skipped', self.search_count([]) - len(stations))
+
+            # Синхронізуємо дані станцій пакетами: через чергу завдань, яку
+            # паралельно обробляють cron-воркери, або в цьому ж виклику
+            SyncJob = self.env['smartlogger.sync.job']
+            if (stations is None or stations) and SyncJob._is_queue_enabled():
+                jobs_enqueued = SyncJob._enqueue_stations(batch_size, stations)
+                # Прогрес пакетів зберігає сама черга
+                self._save_sync_cursor(None)
+                self._commit_progress()
+                # Поточний cron - один із воркерів черги
+                SyncJob.run_worker()
+                backlog = SyncJob._get_queue_backlog(since=run_stats.started_at)
+                if backlog['jobs_pending'] or backlog['jobs_failed']:
+                    # Частину пакетів ще виконають інші воркери (або вони невдалі) -
+                    # синхронізація не вважається успішною
+                    _logger.info("Черга синхронізації: створено %d завдань, очікують %d (%d станцій), невдалих %d",
+                                 jobs_enqueued, backlog['jobs_pending'], backlog['stations_pending'],
+                                 backlog['jobs_failed'])
+                    return dict(backlog, success=True, completed=False, jobs_enqueued=jobs_enqueued,
+                                message=_("Пакети станцій поставлено в чергу; частину з них ще виконають воркери черги"),
+                                stations_processed=run_stats.result_values()['stations_processed'])
+            elif stations is None or stations:
+                # Вибір станцій за бюджетом запитів щоразу інший, тому продовжувати
+                # план попереднього запуску має сенс лише без бюджету
+                with run_phase('kpi_batches'):
+                    batch_stats = self._sync_stations_batch(
+                        base_url, username, password, batch_size, stations=stations,
+                        cursor=cursor if tick_budget <= 0 else None, deadline=deadline)
+                if not batch_stats['completed']:
+                    return self._interrupted_sync_result(cursor)
+
+            self._save_sync_cursor(None)
 
             # Якщо дійшли до цього місця, значить синхронізація пройшла успішно
-            # Скидаємо лічильник помилок автентифікації
-            IrConfigParameter = self.env['ir.config_parameter'].sudo()
-            IrConfigParameter.set_param('huawei.fusionsolar.auth_error_count', '0')
-            IrConfigParameter.set_param('huawei.fusionsolar.last_successful_sync', fields.Datetime.now())
+            self._mark_sync_successful()
 
             _logger.info("Синхронізація даних FusionSolar завершена успішно.")
 
             return {
                 'success': True,
+                'completed': True,
                 'message': _("Синхронізація завершена успішно"),
-                'stations_processed': len(self.search([]))
+                'stations_processed': run_stats.result_values()['stations_processed'],
             }
 
         except UserError as ue:
@@ -247,103 +463,304 @@ class SmartLoggerStation(models.Model):
 
             raise
 
-    def _update_station_list(self, base_url, username, password, request_delay):
-        """Оновлює список станцій з API з підтримкою пагінації."""
-        session = requests.Session()
-        token = None
+    @api.model
+    def _mark_sync_successful(self):
+        """Фіксує успішну синхронізацію та скидає лічильник помилок автентифікації."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        IrConfigParameter.set_param('huawei.fusionsolar.auth_error_count', '0')
+        IrConfigParameter.set_param('huawei.fusionsolar.last_successful_sync', fields.Datetime.now())
+
+    @api.model
+    def _get_sync_tick_budget(self):
+        """Бюджет API запитів одного запуску планової синхронізації (0 - без обмеження)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return max(0, int(IrConfigParameter.get_param('huawei.fusionsolar.sync_tick_api_budget', '0')))
+
+    @api.model
+    def _get_sync_time_budget(self):
+        """Бюджет часу (секунди) одного запуску синхронізації (0 - без обмеження)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return max(0, int(IrConfigParameter.get_param('huawei.fusionsolar.sync_time_budget', '0')))
+
+    @api.model
+    def _read_sync_cursor(self):
+        """Контрольна точка перерваного запуску синхронізації (None - починати спочатку).
+
+        Читається напряму з БД: параметр змінюється після кожного пакету,
+        і ormcache параметрів не повинен скидатися так часто.
+        """
+        self.env.cr.execute("SELECT value FROM ir_config_parameter WHERE key = %s", [SYNC_CURSOR_PARAM])
+        row = self.env.cr.fetchone()
+        try:
+            cursor = json.loads(row[0]) if row and row[0] else None
+        except ValueError:
+            cursor = None
+        if not cursor or cursor.get('phase') not in ('station_list', 'kpi'):
+            return None
+
+        started_at = fields.Datetime.from_string(cursor.get('started_at'))
+        if not started_at or started_at < fields.Datetime.now() - timedelta(hours=SYNC_CURSOR_MAX_AGE_HOURS):
+            _logger.info("Контрольна точка синхронізації від %s застаріла, запуск починається спочатку",
+                         cursor.get('started_at'))
+            return None
+        return cursor
+
+    @api.model
+    def _save_sync_cursor(self, cursor):
+        """Зберігає контрольну точку запуску (None - запуск завершено)."""
+        self._write_config_params_sql(self.env.cr, {SYNC_CURSOR_PARAM: json.dumps(cursor) if cursor else ''})
+
+    @api.model
+    def _interrupted_sync_result(self, cursor):
+        """Результат запуску, зупиненого бюджетом часу чи обмеженням частоти API (продовжиться з контрольної точки)."""
+        _logger.info("Синхронізацію зупинено на етапі %s (сторінка %s, остання станція %s)",
+                     cursor['phase'], cursor.get('page_no'), cursor.get('last_station_id'))
+        return {
+            'success': True,
+            'completed': False,
+            'message': _("Синхронізацію призупинено (бюджет часу або обмеження частоти API); "
+                         "наступний запуск продовжить її"),
+            'stations_processed': 0,
+        }
+
+    @api.model
+    def _get_live_samples_per_hour(self):
+        """Скільки зразків за годину дає планова синхронізація (за інтервалом її cron).
+
+        Вага дозавантаженої години в зведеннях: одна година з getKpiStationHour
+        важить стільки ж, скільки година живих зразків.
+        """
+        cron = self.env['ir.cron'].sudo().with_context(active_test=False).search(
+            [('code', '=', 'model.sync_fusionsolar_data()')], limit=1)
+        minutes = (cron.interval_number * CRON_INTERVAL_MINUTES.get(cron.interval_type, 0)) if cron else 0
+        if minutes <= 0:
+            minutes = DEFAULT_SYNC_INTERVAL_MINUTES
+        return max(1, int(round(60.0 / minutes)))
+
+    @api.model
+    def _get_night_sync_interval(self):
+        """Інтервал (хвилини) опитування станцій, де сонце під горизонтом (0 - як удень)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return max(0, int(IrConfigParameter.get_param('huawei.fusionsolar.night_sync_interval', '120')))
+
+    def _is_daylight(self, when=None):
+        """Чи над горизонтом сонце на станції; без координат станція вважається денною."""
+        self.ensure_one()
+        if not self.latitude and not self.longitude:
+            return True
+        return is_sun_up(self.latitude, self.longitude, when or fields.Datetime.now())
+
+    @api.model
+    def _get_night_resting_ids(self):
+        """ID "нічних" станцій, які в цьому запуску не опитуються.
+
+        Станція пропускається, якщо сонце під горизонтом і після її
+        останньої синхронізації не минув night_sync_interval.
+        """
+        interval = self._get_night_sync_interval()
+        if not interval:
+            return []
+        now = fields.Datetime.now()
+        recent = self.search([
+            ('last_sync', '>', now - timedelta(minutes=interval)),
+            '|', ('latitude', '!=', 0), ('longitude', '!=', 0),
+        ])
+        return [station.id for station in recent if not station._is_daylight(now)]
+
+    @api.model
+    def _select_stations_for_tick(self, limit, exclude_ids=None):
+        """Станції з найбільшою зваженою застарілістю для поточного запуску.
+
+        Оцінка = секунди від last_sync (ніколи не синхронізовані - першими)
+        × вага статусу / sync_priority, тож станція з пріоритетом 10
+        опитується приблизно в 10 разів рідше за станцію з пріоритетом 1.
+        """
+        if limit <= 0:
+            return self.browse()
+        status_cases = ' '.join('WHEN %s THEN %s' for status in SYNC_STATUS_WEIGHTS)
+        params = [value for item in SYNC_STATUS_WEIGHTS.items() for value in item]
+        self.env.cr.execute(f"""
+            SELECT id
+              FROM smartlogger_station
+             WHERE NOT (id = ANY(%s))
+             ORDER BY COALESCE(EXTRACT(EPOCH FROM (now() AT TIME ZONE 'UTC') - last_sync), %s)
+                      * (CASE status {status_cases} ELSE 1.0 END)
+                      / GREATEST(COALESCE(sync_priority, 10), 1) DESC,
+                      id
+             LIMIT %s
+        """, [list(exclude_ids or [])] + [NEVER_SYNCED_STALENESS] + params + [limit])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _update_station_list(self, base_url, username, password, cursor=None, deadline=None):
+        """Оновлює список станцій з API з підтримкою пагінації.
+
+        Сторінки обробляються потоково, щойно надходять: стан станцій
+        завантажується один раз, змінені станції оновлюються точково,
+        а нові створюються одним create() на сторінку без записів у чаттері.
+
+        cursor - контрольна точка запуску синхронізації: імпорт починається
+        зі сторінки cursor['page_no'], а після кожної сторінки вона
+        зсувається і фіксується. deadline (time.monotonic()) зупиняє
+        імпорт між сторінками.
+        Повертає статистику: stations_found, stations_created, stations_updated,
+        api_calls та completed (False - зупинено за deadline).
+        """
+        session = None
+        stats = {'stations_found': 0, 'stations_created': 0, 'stations_updated': 0, 'api_calls': 0,
+                 'completed': True}
 
         try:
-            # Аутентифікація
-            token = self._authenticate(session, base_url, username, password)
+            # Сесія з токеном зі спільного кешу (логін тільки за потреби)
+            session = self._open_api_session(base_url, username, password)
 
-            # Отримання списку станцій з пагінації
-            all_stations = []
-            page_no = 1
+            # Один раз завантажуємо збережені значення: station_code -> поля
+            station_index = self._load_station_index()
+
+            page_no = (cursor.get('page_no') or 1) if cursor else 1
             page_size = 100  # Максимальний розмір сторінки
+            fetched_count = (page_no - 1) * page_size
 
             while True:
                 _logger.info(f"Завантаження сторінки {page_no} списку станцій...")
 
                 # Спробуємо новий метод /stations
                 stations_data = self._fetch_stations_page(
-                    session, base_url, token, page_no, page_size
+                    session, base_url, page_no, page_size
                 )
+                stats['api_calls'] += 1
 
                 if not stations_data:
                     # Якщо новий метод не працює, спробуємо старий getStationList
                     _logger.warning("Метод /stations не працює, спробуємо getStationList...")
-                    stations_data = self._fetch_stations_legacy(session, base_url, token)
+                    stations_data = self._fetch_stations_legacy(session, base_url)
+                    stats['api_calls'] += 1
 
                     if stations_data:
                         # Извлекаем список станций из ответа legacy API
                         stations_list = self._extract_stations_from_response(stations_data)
                         if stations_list:
-                            all_stations.extend(stations_list)
-                        break
-                    else:
-                        break
+                            self._upsert_stations_page(stations_list, station_index, stats)
+                    break
 
                 # Извлекаем список станций из ответа нового API
                 stations_page = self._extract_stations_from_response(stations_data)
                 if not stations_page:
                     break
 
-                all_stations.extend(stations_page)
+                self._upsert_stations_page(stations_page, station_index, stats)
+                fetched_count += len(stations_page)
 
                 # Перевіряємо, чи є ще сторінки
                 total_count = stations_data.get('total', 0)
-                if len(all_stations) >= total_count or len(stations_page) < page_size:
+                if fetched_count >= total_count or len(stations_page) < page_size:
                     break
 
                 page_no += 1
-                time.sleep(request_delay)  # Затримка між запитами
 
-            _logger.info(f"Знайдено {len(all_stations)} станцій у API")
+                # Сторінка зафіксована - перерваний імпорт продовжиться з наступної
+                if cursor is not None:
+                    cursor['page_no'] = page_no
+                    self._save_sync_cursor(cursor)
+                    self._commit_progress()
+                    if deadline and time.monotonic() >= deadline:
+                        stats['completed'] = False
+                        break
 
-            # Створюємо або оновлюємо записи станцій
-            for i, station_data in enumerate(all_stations):
-                try:
-                    # ПРОВЕРКА ТИПА КАЖДОГО ЭЛЕМЕНТА
-                    if not isinstance(station_data, dict):
-                        _logger.error("Елемент %d не є словником: тип=%s, значення=%s",
-                                      i, type(station_data), str(station_data))
-                        continue
-
-                    self._create_or_update_station(station_data)
-                except Exception as e:
-                    _logger.error("Помилка обробки станції %d: %s", i, str(e))
-                    continue
+            _logger.info("Список станцій: знайдено %d, створено %d, оновлено %d",
+                         stats['stations_found'], stats['stations_created'], stats['stations_updated'])
+            return stats
 
         except Exception as e:
             _logger.error("Помилка при оновленні списку станцій: %s", str(e))
             raise
         finally:
             if session:
-                session.close()
+                self._close_api_session(session)
+
+    def _load_station_index(self):
+        """Повертає словник station_code -> збережені основні поля станції."""
+        records = self.search_read([], ['station_code', 'name', 'plant_code', 'capacity', 'region',
+                                        'latitude', 'longitude'])
+        return {record['station_code']: record for record in records}
+
+    def _diff_station_values(self, stored, values):
+        """Повертає лише ті основні поля, значення яких відрізняються від збережених."""
+        changes = {}
+        for field_name in ('name', 'plant_code', 'region'):
+            if (stored.get(field_name) or '') != (values.get(field_name) or ''):
+                changes[field_name] = values.get(field_name)
+        if float_compare(stored.get('capacity') or 0.0, values.get('capacity') or 0.0, precision_digits=3):
+            changes['capacity'] = values.get('capacity')
+        # Координати - лише якщо API їх повернув (інакше зберігаються введені вручну)
+        for field_name in ('latitude', 'longitude'):
+            if field_name in values and float_compare(stored.get(field_name) or 0.0, values[field_name],
+                                                      precision_digits=6):
+                changes[field_name] = values[field_name]
+        return changes
+
+    def _upsert_stations_page(self, stations_page, station_index, stats):
+        """Застосовує сторінку списку станцій: пише тільки зміни, нові створює пакетом."""
+        to_create = []
+
+        for i, station_data in enumerate(stations_page):
+            try:
+                # ПРОВЕРКА ТИПА КАЖДОГО ЭЛЕМЕНТА
+                if not isinstance(station_data, dict):
+                    _logger.error("Елемент %d не є словником: тип=%s, значення=%s",
+                                  i, type(station_data), str(station_data))
+                    continue
+
+                values = self._parse_station_data(station_data)
+                if not values:
+                    continue
+                stats['stations_found'] += 1
+
+                stored = station_index.get(values['station_code'])
+                if stored is None:
+                    to_create.append(values)
+                    # Запам'ятовуємо, щоб дублікати в API не створили станцію двічі
+                    station_index[values['station_code']] = dict(values, id=False)
+                    continue
 
-    def _fetch_stations_page(self, session, base_url, token, page_no, page_size):
+                changes = self._diff_station_values(stored, values)
+                if changes and stored['id']:
+                    _logger.info("Оновлення станції %s: змінені поля %s", values['station_code'], list(changes))
+                    self.browse(stored['id']).write(changes)
+                    stored.update(changes)
+                    stats['stations_updated'] += 1
+
+            except Exception as e:
+                _logger.error("Помилка обробки станції %d: %s", i, str(e))
+                continue
+
+        if to_create:
+            _logger.info("Створення %d нових станцій", len(to_create))
+            created = self.with_context(
+                tracking_disable=True,
+                mail_create_nolog=True,
+                mail_create_nosubscribe=True,
+            ).create(to_create)
+            for station in created:
+                station_index[station.station_code]['id'] = station.id
+            stats['stations_created'] += len(created)
+
+    def _fetch_stations_page(self, session, base_url, page_no, page_size):
         """Отримує сторінку станцій через новий API /stations."""
         try:
-            stations_url = f"{base_url}/stations"
-            headers = {'XSRF-TOKEN': token, 'Content-Type': 'application/json'}
             payload = {
                 "pageNo": str(page_no),
                 "pageSize": str(page_size)
             }
 
-            response = session.post(stations_url, json=payload, headers=headers, timeout=30)
-
-            if response.status_code != 200:
-                _logger.warning("API /stations повернув HTTP %d", response.status_code)
-                return None
-
             try:
-                data = response.json()
+                data = self._api_call(session, base_url, 'stations', payload)
                 # БЕЗОПАСНОЕ ЛОГИРОВАНИЕ ОТВЕТА
                 _logger.info("API /stations відповідь (перші 500 символів): %s", str(data)[:500])
-            except json.JSONDecodeError:
+            except requests.exceptions.HTTPError as http_error:
+                _logger.warning("API /stations повернув HTTP помилку: %s", str(http_error))
+                return None
+            except ValueError:
                 _logger.warning("Неправильна JSON відповідь від API /stations")
-                _logger.warning("Відповідь (перші 500 символів): %s", response.text[:500])
                 return None
 
             if data.get('success'):
@@ -358,25 +775,18 @@ class SmartLoggerStation(models.Model):
             _logger.warning("Не вдалося використати новий API /stations: %s", str(e))
             return None
 
-    def _fetch_stations_legacy(self, session, base_url, token):
+    def _fetch_stations_legacy(self, session, base_url):
         """Отримує станції через застарілий API getStationList."""
         try:
-            stations_url = f"{base_url}/getStationList"
-            headers = {'XSRF-TOKEN': token, 'Content-Type': 'application/json'}
-
-            response = session.post(stations_url, headers=headers, timeout=30)
-
-            if response.status_code != 200:
-                _logger.error("API getStationList повернув HTTP %d", response.status_code)
-                return None
-
             try:
-                data = response.json()
+                data = self._api_call(session, base_url, 'getStationList')
                 # БЕЗОПАСНОЕ ЛОГИРОВАНИЕ ОТВЕТА
                 _logger.info("API getStationList відповідь (перші 500 символів): %s", str(data)[:500])
-            except json.JSONDecodeError:
+            except requests.exceptions.HTTPError as http_error:
+                _logger.error("API getStationList повернув HTTP помилку: %s", str(http_error))
+                return None
+            except ValueError:
                 _logger.error("Неправильна JSON відповідь від API getStationList")
-                _logger.warning("Відповідь (перші 500 символів): %s", response.text[:500])
                 return None
 
             if data.get('success'):
@@ -393,6 +803,28 @@ class SmartLoggerStation(models.Model):
 
     def _create_or_update_station(self, station_data):
         """Створює або оновлює запис станції."""
+        values = self._parse_station_data(station_data)
+        if not values:
+            return
+
+        # Поиск существующей станции
+        station = self.search([('station_code', '=', values['station_code'])], limit=1)
+
+        if not station:
+            _logger.info("Створення нової станції: %s (%s)", values['name'], values['station_code'])
+            station = self.create(values)
+        else:
+            # Оновлюємо тільки змінені основні поля, не торкаючись статистики
+            stored = station.read(['name', 'plant_code', 'capacity', 'region'])[0]
+            changes = self._diff_station_values(stored, values)
+            if changes:
+                _logger.info("Оновлення існуючої станції: %s", station.name)
+                station.write(changes)
+
+        return station
+
+    def _parse_station_data(self, station_data):
+        """Перетворює елемент списку станцій API на значення полів станції (або None)."""
         # ДОПОЛНИТЕЛЬНАЯ ПРОВЕРКА ТИПА
         if not isinstance(station_data, dict):
             _logger.error("station_data не є словником: тип=%s, значення=%s",
@@ -400,7 +832,7 @@ class SmartLoggerStation(models.Model):
             raise ValueError(f"station_data має бути словником, отримано {type(station_data)}")
 
         # ЛОГИРОВАНИЕ СОДЕРЖИМОГО (только ключи для краткости)
-        _logger.info("Обробка станції з ключами: %s", list(station_data.keys()))
+        _logger.debug("Обробка станції з ключами: %s", list(station_data.keys()))
 
         # Ищем код станции - из ваших данных видно, что используется plantCode
         station_code = None
@@ -428,9 +860,6 @@ class SmartLoggerStation(models.Model):
             _logger.warning("Пропущено станцію без коду: доступні ключі=%s", list(station_data.keys()))
             return
 
-        # Поиск существующей станции
-        station = self.search([('station_code', '=', station_code)], limit=1)
-
         # Ищем имя станции - из ваших данных видно, что используется plantName
         name_keys = ['plantName', 'stationName', 'station_name', 'plant_name', 'name']
         station_name = None
@@ -479,103 +908,242 @@ class SmartLoggerStation(models.Model):
             'status': 'active'
         }
 
-        if not station:
-            _logger.info("Створення нової станції: %s (%s)", values['name'], station_code)
-            station = self.create(values)
-        else:
-            _logger.info("Оновлення існуючої станції: %s", station.name)
-            # Оновлюємо тільки основні поля, не торкаючись статистики
-            update_values = {k: v for k, v in values.items() if k not in ['status']}
-            station.write(update_values)
+        # Координати станції (для розрахунку положення сонця)
+        for field_name, keys in (('latitude', ['latitude', 'lat']), ('longitude', ['longitude', 'lng', 'lon'])):
+            for key in keys:
+                try:
+                    values[field_name] = float(station_data[key])
+                    break
+                except (KeyError, ValueError, TypeError):
+                    continue
 
-        return station
+        return values
 
-    def _sync_stations_batch(self, base_url, username, password, batch_size, request_delay):
-        """Синхронізує дані станцій пакетами для оптимізації API запитів."""
-        session = requests.Session()
-        token = None
+    def sync_stations_kpi(self):
+        """Синхронізує KPI лише станцій цього recordset-у.
 
-        try:
-            # Аутентифікація
-            token = self._authenticate(session, base_url, username, password)
+        Список станцій не оновлюється; станції пакуються в найменшу
+        кількість запитів getStationRealKpi (без розбиття за batch_group).
+        """
+        if not self:
+            return {'success': True, 'message': _("Немає станцій для синхронізації"), 'stations_processed': 0}
+
+        self._check_api_blocked_status()
+        base_url, username, password, batch_size, request_delay = self._get_fusionsolar_api_credentials()
+
+        _logger.info("Вибіркова синхронізація KPI %d станцій", len(self))
+        with self.env['smartlogger.sync.run']._track('selected') as run_stats:
+            with run_phase('kpi_batches'):
+                ingest_stats = self._sync_stations_batch(base_url, username, password, batch_size,
+                                                         stations=self)
+        # Фактично записані станції (без невдалих та відкладених пакетів)
+        processed = run_stats.result_values()['stations_processed']
+        return {
+            'success': True,
+            'message': _("Синхронізовано KPI %d з %d станцій") % (processed, len(self)),
+            'stations_processed': processed,
+            'rows_written': ingest_stats['rows'],
+            'api_calls_made': run_stats.total_calls(),
+        }
 
-            # Отримуємо всі станції, сортовані за пріоритетом
-            stations = self.search([], order='sync_priority ASC, id ASC')
+    def _sync_stations_batch(self, base_url, username, password, batch_size, stations=None,
+                             cursor=None, deadline=None):
+        """Синхронізує дані станцій пакетами для оптимізації API запитів.
 
-            _logger.info(f"Початок синхронізації {len(stations)} станцій пакетами по {batch_size}")
+        stations - обмежити синхронізацію цими станціями (вибіркова
+        синхронізація); без нього синхронізуються всі станції за групами.
 
-            # Групуємо станції за batch_group
-            groups = {}
-            for station in stations:
-                group = station.batch_group or 'default'
-                if group not in groups:
-                    groups[group] = []
-                groups[group].append(station)
+        cursor - контрольна точка запуску синхронізації: план пакетів
+        продовжується після cursor['last_station_id'], якщо він не змінився
+        (cursor['plan_hash']; інакше прохід починається спочатку), пакети
+        записуються в порядку плану, і після кожного точка зсувається та фіксується.
+        deadline (time.monotonic()) зупиняє запуск між пакетами.
+        Повертає статистику запису та completed (False - зупинено за deadline).
+        """
+        session = None
 
-            # Обробляємо кожну групу
-            for group_name, group_stations in groups.items():
-                _logger.info(f"Обробка групи '{group_name}' ({len(group_stations)} станцій)")
+        try:
+            # Сесія з токеном зі спільного кешу (логін тільки за потреби)
+            session = self._open_api_session(base_url, username, password)
+
+            plan = self._plan_station_batches(batch_size, stations)
+            if cursor is not None:
+                # Нічні станції, вибір за бюджетом чи зміна груп змінюють план -
+                # тоді остання станція точки нічого не означає
+                plan_hash = hashlib.md5(json.dumps(plan).encode()).hexdigest()
+                if cursor.get('last_station_id') and cursor.get('plan_hash') == plan_hash:
+                    plan = self._resume_station_batches(plan, cursor['last_station_id'])
+                elif cursor.get('last_station_id'):
+                    _logger.info("План пакетів KPI змінився після контрольної точки, прохід виконується спочатку")
+                cursor.update(plan_hash=plan_hash)
+            batches = [self.browse(batch_ids) for batch_ids in plan]
+
+            ingest_stats = {'rows': 0, 'seconds': 0.0, 'completed': True}
+
+            # HTTP запити пакетів усіх груп виконуються паралельно в обмеженому
+            # пулі потоків під спільним лімітером; запис у БД - лише в цьому потоці
+            pacer = self._get_api_pacer('getStationRealKpi')
+            max_retries = self._get_max_retries()
+            max_workers = self._get_max_parallel_requests()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                run_stats = get_active_run_stats()
+                queued = deque(batches)
+                # Запити ставляться обмеженим вікном і доповнюються в міру запису
+                # відповідей; словник зберігає порядок постановки (порядок плану)
+                futures = {}
+                while queued or futures:
+                    while queued and len(futures) < max_workers * KPI_FETCH_WINDOW_PER_WORKER:
+                        batch = queued.popleft()
+                        futures[executor.submit(self._fetch_batch_kpi_concurrent, session, base_url,
+                                                batch.mapped('station_code'), pacer, max_retries,
+                                                run_stats)] = batch
+
+                    if deadline and time.monotonic() >= deadline:
+                        for pending in futures:
+                            pending.cancel()
+                        ingest_stats['completed'] = False
+                        break
 
-                # Розбиваємо групу на пакети
-                for i in range(0, len(group_stations), batch_size):
-                    batch = group_stations[i:i + batch_size]
-                    self._process_stations_batch(session, base_url, token, batch, request_delay)
+                    # З контрольною точкою пакети записуються в порядку плану,
+                    # щоб остання станція однозначно позначала виконану частину
+                    if cursor is not None:
+                        future = next(iter(futures))
+                    else:
+                        future = next(iter(wait(futures, return_when=FIRST_COMPLETED).done))
+                    batch = futures.pop(future)
+                    batch_stats = self._process_stations_batch(
+                        session, base_url, batch, kpi_data=future.result())
+                    ingest_stats['rows'] += batch_stats['rows']
+                    ingest_stats['seconds'] += batch_stats['seconds']
+                    if batch_stats.get('throttled'):
+                        # API обмежує частоту - пакет і решта плану чекають наступного
+                        # запуску (контрольна точка лишається перед цим пакетом)
+                        for pending in futures:
+                            pending.cancel()
+                        ingest_stats['completed'] = False
+                        break
 
-                    # Затримка між пакетами для уникнення перевантаження API
-                    if i + batch_size < len(group_stations):
-                        time.sleep(request_delay * 2)
+                    if cursor is not None:
+                        cursor['last_station_id'] = batch.ids[-1]
+                        self._save_sync_cursor(cursor)
+                        self._commit_progress()
+
+            _logger.info("Запис KPI: %d рядків за %.2f с (%.1f рядків/с)",
+                         ingest_stats['rows'], ingest_stats['seconds'],
+                         self._rows_per_second(ingest_stats['rows'], ingest_stats['seconds']))
+            return ingest_stats
 
         except Exception as e:
             _logger.error("Помилка при пакетній синхронізації: %s", str(e))
             raise
         finally:
             if session:
-                session.close()
+                self._close_api_session(session)
+
+    def _resume_station_batches(self, plan, last_station_id):
+        """Залишає в плані пакетів лише станції після last_station_id.
+
+        Якщо станції вже немає в плані (видалена або "нічна"), план
+        виконується повністю.
+        """
+        flat_ids = [station_id for batch in plan for station_id in batch]
+        if last_station_id not in flat_ids:
+            _logger.info("Станції %s контрольної точки немає в плані, пакети KPI виконуються спочатку",
+                         last_station_id)
+            return plan
+        done_ids = set(flat_ids[:flat_ids.index(last_station_id) + 1])
+        plan = [[station_id for station_id in batch if station_id not in done_ids] for batch in plan]
+        plan = [batch for batch in plan if batch]
+        _logger.info("Продовження пакетів KPI після станції %s: залишилось %d пакетів",
+                     last_station_id, len(plan))
+        return plan
+
+    def _plan_station_batches(self, batch_size, stations=None):
+        """Розбиває станції на пакети запитів getStationRealKpi (списки ID).
+
+        Без stations беруться всі станції, згруповані за batch_group;
+        вибрані станції пакуються одним рядом без часткових пакетів на групу.
+        """
+        if stations is None:
+            # Отримуємо всі станції, сортовані за пріоритетом
+            stations = self.search([], order='sync_priority ASC, id ASC')
 
-    def _process_stations_batch(self, session, base_url, token, stations, request_delay):
-        """Обробляє пакет станцій за один API запит."""
+            # Групуємо станції за batch_group (ідентифікатори, щоб пакети
+            # залишались recordset-ами зі спільним prefetch)
+            groups = {}
+            for station in stations:
+                groups.setdefault(station.batch_group or 'default', []).append(station.id)
+        else:
+            groups = {'selected': stations.sorted(lambda s: (s.sync_priority, s.id)).ids}
+
+        _logger.info(f"Початок синхронізації {len(stations)} станцій пакетами по {batch_size}")
+
+        batches = []
+        for group_name, group_ids in groups.items():
+            _logger.info(f"Обробка групи '{group_name}' ({len(group_ids)} станцій)")
+            for i in range(0, len(group_ids), batch_size):
+                batches.append(group_ids[i:i + batch_size])
+        return batches
+
+    def _process_stations_batch(self, session, base_url, stations, kpi_data=None):
+        """Обробляє пакет станцій за один API запит.
+
+        kpi_data - відповідь getStationRealKpi, вже отримана паралельним
+        етапом; якщо її немає, запит виконується тут (повторна спроба).
+        KPI всього пакету спочатку розбираються, а потім записуються
+        одним set-based кроком у _ingest_kpi_batch. Відповідь про
+        перевищення частоти не розкладається на запити окремих станцій:
+        пакет повертається з throttled=True і чекає наступного запуску.
+        """
         if not stations:
-            return
+            return {'rows': 0, 'seconds': 0.0}
 
         # Формуємо список кодів станцій для пакетного запиту
-        station_codes = []
-        station_map = {}
-
-        for station in stations:
-            code = station.station_code
-            station_codes.append(code)
-            station_map[code] = station
+        station_codes = stations.mapped('station_code')
+        station_map = {station.station_code: station for station in stations}
 
-            # Оновлюємо статистику спроб
-            station.sync_attempts += 1
+        # Оновлюємо статистику спроб одним атомарним запитом
+        self._increment_sync_attempts(stations)
 
         _logger.info(
             f"Обробка пакету з {len(station_codes)} станцій: {', '.join(station_codes[:3])}{'...' if len(station_codes) > 3 else ''}")
 
+        samples = []
         try:
-            # Пакетний запит KPI
-            kpi_data = self._fetch_batch_kpi(session, base_url, token, station_codes)
+            # Пакетний запит KPI (якщо паралельний етап не отримав відповідь)
+            if not kpi_data or self._is_token_expired_response(kpi_data):
+                kpi_data = self._fetch_batch_kpi(session, base_url, station_codes)
+
+            if self._is_throttled_response(kpi_data):
+                _logger.warning("Пакетний запит обмежено за частотою (failCode=%s), пакет відкладено",
+                                kpi_data.get('failCode'))
+                return {'rows': 0, 'seconds': 0.0, 'throttled': True}
 
             if kpi_data and kpi_data.get('success'):
-                # Обробляємо результати для кожної станції
-                for kpi_item in kpi_data.get('data', []):
-                    station_code = kpi_item.get('stationCode')
-                    if station_code in station_map:
-                        self._update_station_kpi(station_map[station_code], kpi_item)
+                # Розбираємо результати для кожної станції
+                kpi_items = [
+                    (station_map[kpi_item.get('stationCode')], kpi_item)
+                    for kpi_item in kpi_data.get('data', [])
+                    if kpi_item.get('stationCode') in station_map
+                ]
+                samples = self._parse_kpi_items(session, base_url, kpi_items)
             else:
                 # Якщо пакетний запит не вдався, обробляємо кожну станцію окремо
                 _logger.warning("Пакетний запит не вдався, обробляємо станції окремо")
                 for station in stations:
-                    self._process_single_station(session, base_url, token, station)
-                    time.sleep(request_delay)
+                    sample = self._process_single_station(session, base_url, station)
+                    if sample:
+                        samples.append(sample)
 
         except Exception as e:
             _logger.error(f"Помилка обробки пакету станцій: {str(e)}")
             # При помилці обробляємо кожну станцію окремо
+            samples = []
             for station in stations:
                 try:
-                    self._process_single_station(session, base_url, token, station)
-                    time.sleep(request_delay)
+                    sample = self._process_single_station(session, base_url, station)
+                    if sample:
+                        samples.append(sample)
                 except Exception as single_error:
                     _logger.error(f"Помилка обробки станції {station.station_code}: {str(single_error)}")
                     station.write({
@@ -583,35 +1151,46 @@ class SmartLoggerStation(models.Model):
                         'last_error': str(single_error)
                     })
 
-    def _fetch_batch_kpi(self, session, base_url, token, station_codes):
+        return self._ingest_kpi_batch(samples)
+
+    def _fetch_batch_kpi(self, session, base_url, station_codes):
         """Отримує KPI для пакету станцій за один запит."""
         try:
-            kpi_url = f"{base_url}/getStationRealKpi"
-            headers = {'XSRF-TOKEN': token, 'Content-Type': 'application/json'}
-
             # Формуємо запит з масивом кодів станцій
             payload = {
                 "stationCodes": ",".join(station_codes)  # Коми-розділений список
             }
 
-            response = session.post(kpi_url, json=payload, headers=headers, timeout=60)
-            response.raise_for_status()
-
-            return response.json()
+            return self._api_call(session, base_url, 'getStationRealKpi', payload, timeout=60)
 
         except Exception as e:
             _logger.error(f"Помилка пакетного запиту KPI: {str(e)}")
             return None
 
-    def _process_single_station(self, session, base_url, token, station):
-        """Обробляє окрему станцію."""
+    def _fetch_batch_kpi_concurrent(self, session, base_url, station_codes, pacer, max_retries, run_stats=None):
+        """Запит KPI пакету для пулу потоків: лише HTTP, без звернень до БД/ORM.
+
+        Помилки не піднімаються: None означає, що пакет буде повторно
+        запитано в основному потоці через _api_call. run_stats -
+        статистика запуску основного потоку (журнал синхронізації).
+        """
         try:
-            kpi_data = self._fetch_station_kpi(session, base_url, token, station.station_code)
+            payload = {"stationCodes": ",".join(station_codes)}
+            with activate_run_stats(run_stats):
+                return self._api_post(session, f"{base_url}/getStationRealKpi", payload, 60, pacer, max_retries)
+        except Exception as e:
+            _logger.warning(f"Паралельний запит KPI пакету не вдався: {str(e)}")
+            return None
+
+    def _process_single_station(self, session, base_url, station):
+        """Обробляє окрему станцію та повертає розібраний KPI зразок (або None)."""
+        try:
+            kpi_data = self._fetch_station_kpi(session, base_url, station.station_code)
 
             if kpi_data and kpi_data.get('success'):
                 kpi_list = kpi_data.get('data', [])
                 if kpi_list:
-                    self._update_station_kpi(station, kpi_list[0])
+                    return self._parse_station_kpi_safe(station, kpi_list[0], session, base_url)
                 else:
                     station.write({'status': 'inactive'})
             else:
@@ -626,92 +1205,306 @@ class SmartLoggerStation(models.Model):
                 'status': 'sync_error',
                 'last_error': str(e)
             })
+        return None
 
-    def _fetch_station_kpi(self, session, base_url, token, station_code):
+    def _fetch_station_kpi(self, session, base_url, station_code):
         """Отримує KPI для окремої станції."""
         try:
-            kpi_url = f"{base_url}/getStationRealKpi"
-            headers = {'XSRF-TOKEN': token, 'Content-Type': 'application/json'}
             payload = {"stationCodes": station_code}
 
-            response = session.post(kpi_url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-
-            return response.json()
+            return self._api_call(session, base_url, 'getStationRealKpi', payload)
 
         except Exception as e:
             _logger.error(f"Помилка запиту KPI для станції {station_code}: {str(e)}")
             return None
 
-    def _update_station_kpi(self, station, kpi_data):
+    def _update_station_kpi(self, station, kpi_data, session=None, base_url=None):
         """Оновлює KPI данні станції з підтримкою різних форматів API."""
+        sample = self._parse_station_kpi_safe(station, kpi_data, session, base_url)
+        if sample:
+            self._ingest_kpi_batch([sample])
+
+    def _parse_kpi_items(self, session, base_url, kpi_items):
+        """Розбирає KPI пакету станцій (список пар (станція, kpi_item)).
+
+        Потужність пристроїв для станцій без поточної потужності
+        запитується один раз для всього пакету, а не для кожної станції.
+        """
+        parsed = [
+            (station, kpi_item, self._parse_station_kpi_safe(station, kpi_item, device_power={}))
+            for station, kpi_item in kpi_items
+        ]
+        # Вночі нульова потужність очікувана - пристрої не опитуються
+        now = fields.Datetime.now()
+        zero_power = self.browse([
+            station.id for station, kpi_item, sample in parsed
+            if sample and not sample['current_power'] and station._is_daylight(now)
+        ])
+        device_power = self._get_batch_device_power(zero_power, session, base_url)
+
+        samples = []
+        for station, kpi_item, sample in parsed:
+            if sample and device_power.get(station.id):
+                # Повторний розбір з потужністю пристроїв, щоб перерахувати статус
+                sample = self._parse_station_kpi_safe(station, kpi_item, device_power=device_power)
+            if sample:
+                samples.append(sample)
+        return samples
+
+    def _parse_station_kpi_safe(self, station, kpi_data, session=None, base_url=None, device_power=None):
+        """Розбирає KPI станції; при помилці позначає станцію як помилкову."""
         try:
-            station_kpi = kpi_data.get('dataItemMap', {})
+            return self._parse_station_kpi(station, kpi_data, session, base_url, device_power)
+        except Exception as e:
+            _logger.error(f"Помилка оновлення KPI станції {station.station_code}: {str(e)}")
+            station.write({
+                'status': 'error',
+                'last_error': str(e)
+            })
+            return None
+
+    def _parse_station_kpi(self, station, kpi_data, session=None, base_url=None, device_power=None):
+        """Розбирає відповідь getStationRealKpi у KPI зразок для _ingest_kpi_batch.
+
+        device_power - вже отримана потужність пристроїв пакету (station_id -> кВт);
+        без нього потужність пристроїв запитується лише для цієї станції.
+        """
+        station_kpi = kpi_data.get('dataItemMap', {})
 
-            # Логирование полученных данных для отладки
-            _logger.info(f"KPI дані для станції {station.station_code}: {list(station_kpi.keys())}")
+        # Логирование полученных данных для отладки
+        _logger.info(f"KPI дані для станції {station.station_code}: {list(station_kpi.keys())}")
 
-            # Пытаемся найти текущую мощность из разных возможных полей
-            current_power = self._extract_current_power(station_kpi)
+        # Пытаемся найти текущую мощность из разных возможных полей
+        current_power = self._extract_current_power(station_kpi)
 
-            # Если current_power все еще 0, пытаемся получить данные от устройств
-            if current_power == 0:
+        # Если current_power все еще 0, пытаемся получить данные от устройств
+        if current_power == 0:
+            if device_power is not None:
+                current_power = device_power.get(station.id, 0.0)
+            elif not station._is_daylight():
+                _logger.debug(f"Сонце під горизонтом, пристрої станції {station.station_code} не опитуються")
+            else:
                 _logger.info(f"Спробуємо отримати дані від пристроїв для станції {station.station_code}")
-                current_power = self._try_get_device_power(station)
+                current_power = self._try_get_device_power(station, session, base_url)
 
+        return {
+            'station_id': station.id,
+            'current_power': current_power,
             # Извлекаем энергетические данные
-            daily_energy = self._safe_float_extract(station_kpi, [
+            'daily_energy': self._safe_float_extract(station_kpi, [
                 'day_power', 'dayPower', 'daily_power', 'today_power'
-            ])
-
-            monthly_energy = self._safe_float_extract(station_kpi, [
+            ]),
+            'monthly_energy': self._safe_float_extract(station_kpi, [
                 'month_power', 'monthPower', 'monthly_power', 'this_month_power'
-            ])
-
-            yearly_energy = self._safe_float_extract(station_kpi, [
+            ]),
+            'yearly_energy': self._safe_float_extract(station_kpi, [
                 'year_power', 'yearPower', 'yearly_power', 'this_year_power'
-            ])
-
-            lifetime_energy = self._safe_float_extract(station_kpi, [
+            ]),
+            'lifetime_energy': self._safe_float_extract(station_kpi, [
                 'total_power', 'totalPower', 'lifetime_power', 'cumulative_power'
-            ])
-
+            ]),
             # Определяем статус на основе данных
-            new_status = self._determine_station_status(current_power, station_kpi)
+            'status': self._determine_station_status(current_power, station_kpi),
+        }
 
-            # Оновлення полів станції
-            station.write({
-                'current_power': current_power,
-                'daily_energy': daily_energy,
-                'monthly_energy': monthly_energy,
-                'yearly_energy': yearly_energy,
-                'lifetime_energy': lifetime_energy,
-                'last_sync': fields.Datetime.now(),
-                'status': new_status,
-                'successful_syncs': station.successful_syncs + 1,
-                'last_error': False
-            })
+    @api.model
+    def _rows_per_second(self, rows, seconds):
+        """Швидкість запису для логів продуктивності."""
+        return rows / seconds if seconds > 0 else 0.0
 
-            # Зберігаємо історичні дані KPI
-            self.env['smartlogger.data'].create({
-                'station_id': station.id,
-                'timestamp': fields.Datetime.now(),
-                'current_power': current_power,
-                'daily_energy': daily_energy,
-                'monthly_energy': monthly_energy,
-                'yearly_energy': yearly_energy,
-                'lifetime_energy': lifetime_energy,
-            })
+    @api.model
+    def _invalidate_station_cache(self, stations, fnames):
+        """Скидає кеш ORM після прямих SQL оновлень рядків станцій."""
+        if hasattr(stations, 'invalidate_recordset'):
+            stations.invalidate_recordset(fnames)
+        else:
+            stations.invalidate_cache(fnames, stations.ids)
 
-            _logger.info(
-                f"KPI станції {station.name} оновлено. Потужність: {current_power} кВт, Денна енергія: {daily_energy} кВт·год")
+    @api.model
+    def _increment_sync_attempts(self, stations):
+        """Атомарно збільшує sync_attempts для всього пакету одним запитом."""
+        if not stations:
+            return
+        self.env.cr.execute("""
+            UPDATE smartlogger_station
+               SET sync_attempts = COALESCE(sync_attempts, 0) + 1
+             WHERE id IN %s
+        """, [tuple(stations.ids)])
+        self._invalidate_station_cache(stations, ['sync_attempts'])
 
-        except Exception as e:
-            _logger.error(f"Помилка оновлення KPI станції {station.station_code}: {str(e)}")
-            station.write({
-                'status': 'error',
-                'last_error': str(e)
-            })
+    @api.model
+    def _write_tracked_telemetry(self, samples, tracked_fields, now):
+        """Записує через ORM (з трекінгом) лише змінені телеметричні поля, вибрані в налаштуваннях."""
+        for sample in samples:
+            station = self.browse(sample['station_id'])
+            new_values = dict(sample, last_sync=now)
+            changes = {
+                field_name: new_values[field_name]
+                for field_name in tracked_fields
+                if station[field_name] != new_values[field_name]
+            }
+            if changes:
+                station.write(changes)
+
+    @api.model
+    def _ingest_kpi_batch(self, samples):
+        """Записує KPI пакету станцій set-based операціями.
+
+        Одне multi-row створення smartlogger.data, upsert зведень KPI, один UPDATE рядків
+        станцій з атомарним збільшенням successful_syncs та групований
+        запис змін статусу (лише для станцій, де статус змінився, щоб
+        зберегти його відстеження в чаттері). Після запису правила алертів
+        перевіряються лише для станцій пакету.
+
+        Зразок, що не відрізняється від збережених значень станції, не
+        створює рядок smartlogger.data: для станції оновлюється лише
+        last_sync, а читачі історії трактують пропущені зразки як
+        продовження попереднього значення (ступінчаста функція).
+        Зведення KPI отримують усі зразки.
+
+        Повертає статистику запису: кількість рядків, пропущених зразків і тривалість.
+        """
+        if not samples:
+            return {'rows': 0, 'skipped': 0, 'seconds': 0.0}
+
+        # Один зразок на станцію (API інколи дублює станції у відповіді)
+        samples = list({sample['station_id']: sample for sample in samples}.values())
+
+        start_time = time.monotonic()
+        now = fields.Datetime.now()
+        stations = self.browse([sample['station_id'] for sample in samples])
+
+        # Порівняння з останніми збереженими значеннями - до будь-якого запису
+        unchanged_ids = set()
+        if self._is_skip_unchanged_enabled():
+            unchanged_ids = {
+                sample['station_id'] for sample in samples
+                if self._is_unchanged_sample(self.browse(sample['station_id']), sample)
+            }
+        changed_samples = [sample for sample in samples if sample['station_id'] not in unchanged_ids]
+
+        # Зміни статусу - через ORM, згруповано за новим статусом
+        ids_by_status = {}
+        for sample in samples:
+            ids_by_status.setdefault(sample['status'], []).append(sample['station_id'])
+        for status, station_ids in ids_by_status.items():
+            changed = self.browse(station_ids).filtered(lambda s: s.status != status)
+            if changed:
+                # Алерти всього пакету перевіряються нижче, після запису KPI
+                changed.with_context(skip_alert_evaluation=True).write({'status': status})
+
+        # Телеметрія без трекінгу пишеться SQL нижче; поля, для яких трекінг
+        # увімкнено в налаштуваннях, попередньо записуються через ORM
+        tracked_fields = self._get_tracked_telemetry_fields()
+        if tracked_fields:
+            self._write_tracked_telemetry(changed_samples, tracked_fields, now)
+
+        # Історичні дані KPI - одне multi-row створення (лише змінені зразки)
+        self.env['smartlogger.data'].create([{
+            'station_id': sample['station_id'],
+            'timestamp': now,
+            'current_power': sample['current_power'],
+            'daily_energy': sample['daily_energy'],
+            'monthly_energy': sample['monthly_energy'],
+            'yearly_energy': sample['yearly_energy'],
+            'lifetime_energy': sample['lifetime_energy'],
+        } for sample in changed_samples])
+
+        # Погодинні, щоденні та щомісячні зведення - по одному upsert на рівень
+        # (усі зразки: наявність погодинного зведення означає, що година не є пропуском)
+        for model_name in ROLLUP_MODELS:
+            self.env[model_name]._upsert_samples(samples, now)
+
+        # Нове покоління даних: кеш дашборду стає недійсним після фіксації транзакції
+        self.env['smartlogger.dashboard.cache']._bump_generation()
+
+        # Незмінні зразки - лише свіжість станції, без запису телеметрії
+        if unchanged_ids:
+            self.env.cr.execute("""
+                UPDATE smartlogger_station
+                   SET last_sync = %s,
+                       connection_status = 'connected',
+                       successful_syncs = COALESCE(successful_syncs, 0) + 1,
+                       last_error = NULL,
+                       write_uid = %s,
+                       write_date = %s
+                 WHERE id IN %s
+            """, [now, self.env.uid, now, tuple(unchanged_ids)])
+
+        # Поточні KPI станцій - один UPDATE ... FROM (VALUES ...)
+        if changed_samples:
+            self._update_station_telemetry(changed_samples, now)
+        self._invalidate_station_cache(stations, [
+            'current_power', 'daily_energy', 'monthly_energy', 'yearly_energy', 'lifetime_energy',
+            'efficiency', 'last_sync', 'connection_status', 'successful_syncs', 'last_error', 'write_uid', 'write_date',
+        ])
+
+        # Правила алертів - лише для станцій цього пакету
+        self.env['smartlogger.alert']._evaluate_stations(stations)
+
+        seconds = time.monotonic() - start_time
+        _logger.info("Пакет KPI записано: %d станцій за %.3f с (%.1f рядків/с), без змін: %d",
+                     len(changed_samples), seconds, self._rows_per_second(len(changed_samples), seconds),
+                     len(unchanged_ids))
+
+        run_stats = get_active_run_stats()
+        if run_stats is not None:
+            run_stats.add_seconds('db_write', seconds)
+            run_stats.add('rows_written', len(changed_samples))
+            run_stats.add('samples_unchanged', len(unchanged_ids))
+            run_stats.add('stations_processed', len(samples))
+
+        return {'rows': len(changed_samples), 'skipped': len(unchanged_ids), 'seconds': seconds}
+
+    @api.model
+    def _is_skip_unchanged_enabled(self):
+        """Чи пропускати рядки історії для зразків, що не відрізняються від попередніх."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return IrConfigParameter.get_param('huawei.fusionsolar.skip_unchanged_samples', 'true') == 'true'
+
+    @api.model
+    def _is_unchanged_sample(self, station, sample):
+        """Чи збігається KPI зразок з останніми збереженими значеннями станції."""
+        if not station.last_sync:
+            return False
+        return all(
+            not float_compare(station[field_name] or 0.0, sample[field_name] or 0.0, precision_digits=3)
+            for field_name in KPI_SAMPLE_FIELDS
+        )
+
+    @api.model
+    def _update_station_telemetry(self, samples, now):
+        """Записує поточні KPI станцій одним UPDATE ... FROM (VALUES ...)."""
+        values_sql = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(samples))
+        params = [now, self.env.uid, now]
+        for sample in samples:
+            params.extend([
+                sample['station_id'],
+                float(sample['current_power']),
+                float(sample['daily_energy']),
+                float(sample['monthly_energy']),
+                float(sample['yearly_energy']),
+                float(sample['lifetime_energy']),
+            ])
+        self.env.cr.execute(f"""
+            UPDATE smartlogger_station AS s
+               SET current_power = v.current_power,
+                   daily_energy = v.daily_energy,
+                   monthly_energy = v.monthly_energy,
+                   yearly_energy = v.yearly_energy,
+                   lifetime_energy = v.lifetime_energy,
+                   efficiency = CASE WHEN s.capacity > 0
+                                     THEN v.current_power / s.capacity * 100 ELSE 0 END,
+                   last_sync = %s,
+                   connection_status = 'connected',
+                   successful_syncs = COALESCE(s.successful_syncs, 0) + 1,
+                   last_error = NULL,
+                   write_uid = %s,
+                   write_date = %s
+              FROM (VALUES {values_sql}) AS v(id, current_power, daily_energy, monthly_energy,
+                                             yearly_energy, lifetime_energy)
+             WHERE s.id = v.id
+        """, params)
 
     def _extract_current_power(self, station_kpi):
         """Извлекает текущую мощность из различных возможных полей API."""
@@ -796,8 +1589,20 @@ class SmartLoggerStation(models.Model):
         else:
             return 'inactive'  # Ни энергии за день, ни текущей мощности = неактивна
 
-    def _try_get_device_power(self, station):
+    def _try_get_device_power(self, station, session=None, base_url=None):
         """Пытается получить текущую мощность от устройств станции (если getStationRealKpi не возвращает)."""
+        return self._get_batch_device_power(station, session, base_url).get(station.id, 0.0)
+
+    def _get_batch_device_power(self, stations, session=None, base_url=None):
+        """Потужність пристроїв для пакету станцій без поточної потужності: station_id -> кВт.
+
+        Інвертори беруться з реєстру smartlogger.device, KPI всіх станцій
+        пакету запитуються спільними пакетами getDevRealKpi.
+        """
+        if not stations:
+            return {}
+
+        own_session = False
         try:
             # Проверяем, включен ли запрос к устройствам
             IrConfigParameter = self.env['ir.config_parameter'].sudo()
@@ -805,117 +1610,24 @@ class SmartLoggerStation(models.Model):
 
             if not use_device_api:
                 _logger.info("Запит до API пристроїв вимкнено в конфігурації")
-                return 0.0
-
-            # Получаем учетные данные для отдельного запроса
-            base_url, username, password, batch_size, request_delay = self._get_fusionsolar_api_credentials()
-
-            session = requests.Session()
-            token = self._authenticate(session, base_url, username, password)
-
-            # Получаем список устройств станции
-            device_power = self._get_devices_power(session, base_url, token, station.station_code)
-
-            session.close()
-            return device_power
-
-        except Exception as e:
-            _logger.warning(f"Не вдалося отримати потужність пристроїв для станції {station.station_code}: {str(e)}")
-            return 0.0
-
-    def _get_devices_power(self, session, base_url, token, station_code):
-        """Получает суммарную мощность всех устройств станции."""
-        try:
-            # Получаем задержку для API устройств
-            IrConfigParameter = self.env['ir.config_parameter'].sudo()
-            device_api_delay = float(IrConfigParameter.get_param('huawei.fusionsolar.device_api_delay', '0.5'))
-
-            # Сначала получаем список устройств
-            device_list_url = f"{base_url}/getDevList"
-            headers = {'XSRF-TOKEN': token, 'Content-Type': 'application/json'}
-            payload = {"stationCodes": station_code}
-
-            response = session.post(device_list_url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-
-            device_data = response.json()
-            if not device_data.get('success'):
-                _logger.warning(f"Помилка отримання списку пристроїв: {device_data.get('message')}")
-                return 0.0
-
-            devices = device_data.get('data', [])
-            if not devices:
-                return 0.0
-
-            total_power = 0.0
-            device_count = 0
-
-            # Получаем KPI для каждого устройства типа 1 (инверторы)
-            for device in devices:
-                device_type = device.get('devTypeId')
-                device_id = device.get('id')
-
-                if device_type == 1:  # Инвертор
-                    try:
-                        device_power = self._get_single_device_power(session, base_url, token, device_id)
-                        total_power += device_power
-                        device_count += 1
-                        _logger.info(f"Пристрій {device.get('devName', device_id)}: {device_power} кВт")
-                    except Exception as e:
-                        _logger.warning(f"Помилка отримання потужності пристрою {device_id}: {str(e)}")
-                        continue
-
-                    # Добавляем задержку между запросами
-                    time.sleep(device_api_delay)
-
-            _logger.info(f"Загальна потужність {device_count} пристроїв станції {station_code}: {total_power} кВт")
-            return total_power
-
-        except Exception as e:
-            _logger.error(f"Помилка отримання потужності пристроїв: {str(e)}")
-            return 0.0
-
-    def _get_single_device_power(self, session, base_url, token, device_id):
-        """Получает мощность отдельного устройства."""
-        try:
-            device_kpi_url = f"{base_url}/getDevRealKpi"
-            headers = {'XSRF-TOKEN': token, 'Content-Type': 'application/json'}
-            payload = {"devIds": str(device_id), "devTypeId": "1"}
-
-            response = session.post(device_kpi_url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-
-            device_kpi_data = response.json()
-            if not device_kpi_data.get('success'):
-                return 0.0
-
-            device_data_list = device_kpi_data.get('data', [])
-            if not device_data_list:
-                return 0.0
-
-            device_data = device_data_list[0]
-            device_kpi = device_data.get('dataItemMap', {})
-
-            # Пытаемся извлечь active_power или другие поля мощности
-            power_fields = [
-                'active_power', 'activePower', 'real_power', 'realPower',
-                'power', 'current_power', 'instant_power'
-            ]
+                return {}
 
-            for field in power_fields:
-                if field in device_kpi:
-                    try:
-                        power_value = float(device_kpi[field])
-                        if power_value > 0:
-                            return power_value
-                    except (ValueError, TypeError):
-                        continue
+            # Використовуємо сесію поточної синхронізації, а якщо її немає -
+            # відкриваємо нову з токеном зі спільного кешу (без повторного логіну)
+            if session is None:
+                base_url, username, password, batch_size, request_delay = self._get_fusionsolar_api_credentials()
+                session = self._open_api_session(base_url, username, password)
+                own_session = True
 
-            return 0.0
+            with run_phase('device_fallback'):
+                return self.env['smartlogger.device']._get_stations_power(session, base_url, stations)
 
         except Exception as e:
-            _logger.warning(f"Помилка отримання KPI пристрою {device_id}: {str(e)}")
-            return 0.0
+            _logger.warning(f"Не вдалося отримати потужність пристроїв для {len(stations)} станцій: {str(e)}")
+            return {}
+        finally:
+            if own_session and session:
+                self._close_api_session(session)
 
     def _authenticate(self, session, base_url, username, password):
         """Аутентифікація в API з правильною обробкою JSON відповідей."""
@@ -1008,6 +1720,226 @@ class SmartLoggerStation(models.Model):
             self._handle_auth_error(error_msg)
             raise UserError(error_msg)
 
+    @api.model
+    def _get_token_ttl_minutes(self):
+        """Термін, протягом якого збережений токен вважається дійсним."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return int(IrConfigParameter.get_param('huawei.fusionsolar.token_ttl_minutes', '25'))
+
+    @api.model
+    def _read_token_params(self, cr):
+        """Читає параметри кешу токена напряму з БД (без ormcache)."""
+        cr.execute("SELECT key, value FROM ir_config_parameter WHERE key IN %s",
+                   [(TOKEN_PARAM, TOKEN_EXPIRY_PARAM, TOKEN_OWNER_PARAM)])
+        return dict(cr.fetchall())
+
+    @api.model
+    def _write_config_params_sql(self, cr, values):
+        """Зберігає параметри напряму в БД (кеш токена, швидкості пейсерів)."""
+        for key, value in values.items():
+            cr.execute("""
+                INSERT INTO ir_config_parameter (key, value, create_uid, create_date, write_uid, write_date)
+                VALUES (%s, %s, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+                ON CONFLICT (key) DO UPDATE
+                    SET value = EXCLUDED.value, write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+            """, [key, value, self.env.uid, self.env.uid])
+
+    @api.model
+    def _valid_token_from(self, values, base_url, username):
+        """Повертає токен з параметрів, якщо він належить цьому акаунту і не прострочений."""
+        token = values.get(TOKEN_PARAM)
+        expiry = values.get(TOKEN_EXPIRY_PARAM)
+        if not token or not expiry or values.get(TOKEN_OWNER_PARAM) != f"{base_url}|{username}":
+            return None
+        if fields.Datetime.from_string(expiry) <= fields.Datetime.now():
+            return None
+        return token
+
+    @api.model
+    def _get_cached_api_token(self, base_url, username):
+        """Повертає XSRF токен зі спільного кешу в БД, якщо він ще дійсний."""
+        # Окремий курсор бачить токен, збережений іншими воркерами,
+        # навіть якщо поточна транзакція почалась раніше
+        with self.env.registry.cursor() as cr:
+            return self._valid_token_from(self._read_token_params(cr), base_url, username)
+
+    @api.model
+    def _refresh_api_token(self, session, base_url, username, password, stale_token=None):
+        """Отримує новий токен, серіалізуючи логін між воркерами Odoo.
+
+        Якщо поки ми чекали блокування інший воркер вже отримав новий токен
+        (відмінний від stale_token), повторний логін не виконується.
+        """
+        with self.env.registry.cursor() as cr:
+            cr.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [TOKEN_PARAM])
+            token = self._valid_token_from(self._read_token_params(cr), base_url, username)
+            if token and token != stale_token:
+                _logger.info("FusionSolar API: використано токен, оновлений іншим процесом.")
+                return token
+
+            with run_phase('login'):
+                token = self._authenticate(session, base_url, username, password)
+            run_stats = get_active_run_stats()
+            if run_stats is not None:
+                run_stats.count_call('login')
+            expiry = fields.Datetime.now() + timedelta(minutes=self._get_token_ttl_minutes())
+            self._write_config_params_sql(cr, {
+                TOKEN_PARAM: token,
+                TOKEN_EXPIRY_PARAM: fields.Datetime.to_string(expiry),
+                TOKEN_OWNER_PARAM: f"{base_url}|{username}",
+            })
+            return token
+
+    @api.model
+    def _open_api_session(self, base_url, username, password):
+        """Відкриває HTTP сесію з токеном зі спільного кешу (логін тільки за потреби)."""
+        session = requests.Session()
+        session.headers.update({'Content-Type': 'application/json'})
+        try:
+            token = self._get_cached_api_token(base_url, username)
+            if token:
+                _logger.info("FusionSolar API: використано збережений токен, логін не потрібен.")
+            else:
+                token = self._refresh_api_token(session, base_url, username, password)
+        except Exception:
+            session.close()
+            raise
+
+        session.headers['XSRF-TOKEN'] = token
+        return session
+
+    @api.model
+    def _is_token_expired_response(self, data):
+        """Перевіряє, чи повідомляє відповідь API про прострочений токен."""
+        if not isinstance(data, dict) or data.get('success'):
+            return False
+        try:
+            return int(data.get('failCode')) in RELOGIN_FAIL_CODES
+        except (ValueError, TypeError):
+            return False
+
+    @api.model
+    def _get_api_pacer(self, endpoint):
+        """Спільний для процесу AIMD пейсер ендпоінта.
+
+        Стартова швидкість - вивчена раніше (pacer_rate.<endpoint>), а для нового
+        ендпоінта - 1 запит на request_delay (device_api_delay для пристроїв).
+        """
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        if endpoint in ('getDevList', 'getDevRealKpi'):
+            delay = float(IrConfigParameter.get_param('huawei.fusionsolar.device_api_delay', '0.5'))
+        else:
+            delay = float(IrConfigParameter.get_param('huawei.fusionsolar.request_delay', '1.0'))
+        min_rate = float(IrConfigParameter.get_param('huawei.fusionsolar.pacer_min_rate', '0.05'))
+        max_rate = float(IrConfigParameter.get_param('huawei.fusionsolar.pacer_max_rate', '5.0'))
+        increase = float(IrConfigParameter.get_param('huawei.fusionsolar.pacer_increase', '0.02'))
+        decrease_factor = float(IrConfigParameter.get_param('huawei.fusionsolar.pacer_decrease_factor', '0.5'))
+
+        learned_rate = IrConfigParameter.get_param(PACER_RATE_PARAM_PREFIX + endpoint)
+        initial_rate = float(learned_rate) if learned_rate else (1.0 / delay if delay > 0 else max_rate)
+
+        return get_pacer((self.env.cr.dbname, endpoint), initial_rate,
+                         min_rate, max_rate, increase, decrease_factor)
+
+    @api.model
+    def _save_pacer_rates(self):
+        """Зберігає вивчені швидкості пейсерів, щоб наступні запуски стартували з них."""
+        values = {
+            PACER_RATE_PARAM_PREFIX + key[1]: '%.4f' % pacer.rate
+            for key, pacer in iter_pacers((self.env.cr.dbname,))
+        }
+        if values:
+            # Окремий курсор: швидкість, вивчена під час невдалої синхронізації, теж зберігається
+            with self.env.registry.cursor() as cr:
+                self._write_config_params_sql(cr, values)
+
+    @api.model
+    def _close_api_session(self, session):
+        """Закриває HTTP сесію та зберігає вивчені швидкості пейсерів."""
+        session.close()
+        try:
+            self._save_pacer_rates()
+        except Exception as e:
+            _logger.warning(f"Не вдалося зберегти швидкості пейсерів API: {str(e)}")
+
+    @api.model
+    def _get_max_retries(self):
+        """Кількість повторів запиту після відповіді про перевищення частоти."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return max(0, int(IrConfigParameter.get_param('huawei.fusionsolar.max_retries', '3')))
+
+    @api.model
+    def _get_max_parallel_requests(self):
+        """Розмір пулу потоків для паралельних запитів KPI."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return max(1, int(IrConfigParameter.get_param('huawei.fusionsolar.max_parallel_requests', '4')))
+
+    def _is_throttled_response(self, data):
+        """Перевіряє, чи повідомляє відповідь API про перевищення частоти запитів."""
+        if not isinstance(data, dict) or data.get('success'):
+            return False
+        try:
+            return int(data.get('failCode')) in THROTTLE_FAIL_CODES
+        except (ValueError, TypeError):
+            return False
+
+    def _api_post(self, session, url, payload, timeout, pacer, max_retries=0):
+        """HTTP частина виклику API без звернень до БД (безпечна для потоків).
+
+        Успішна відповідь пришвидшує пейсер, failCode 407/20429 сповільнює його,
+        і запит повторюється (не більше max_retries разів).
+        """
+        run_stats = get_active_run_stats()
+        for attempt in range(max_retries + 1):
+            pacer.acquire()
+            response = session.post(url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+            if run_stats is not None:
+                run_stats.count_call(url.rsplit('/', 1)[-1], data)
+
+            if self._is_throttled_response(data):
+                pacer.on_throttle()
+                _logger.warning("FusionSolar API: перевищено частоту запитів (failCode=%s) для %s, "
+                                "швидкість знижено до %.3f запитів/с",
+                                data.get('failCode'), url, pacer.rate)
+                continue
+
+            if isinstance(data, dict) and data.get('success'):
+                pacer.on_success()
+            return data
+
+        return data
+
+    @api.model
+    def _api_call(self, session, base_url, endpoint, payload=None, timeout=30):
+        """Виконує POST запит до FusionSolar API через сесію з _open_api_session.
+
+        Якщо API повідомляє, що токен прострочений, один раз прозоро
+        виконується повторний логін і запит повторюється.
+        Повертає розібрану JSON відповідь.
+        """
+        url = f"{base_url}/{endpoint}"
+        pacer = self._get_api_pacer(endpoint)
+        max_retries = self._get_max_retries()
+
+        for attempt in range(2):
+            used_token = session.headers.get('XSRF-TOKEN')
+            data = self._api_post(session, url, payload, timeout, pacer, max_retries)
+
+            if attempt == 0 and self._is_token_expired_response(data):
+                _logger.info("FusionSolar API: токен прострочений (failCode=%s), повторний логін.",
+                             data.get('failCode'))
+                with _session_relogin_lock:
+                    # Сесію могли вже оновити, поки очікувалось блокування
+                    if session.headers.get('XSRF-TOKEN') == used_token:
+                        username, password = self._get_fusionsolar_api_credentials()[1:3]
+                        session.headers['XSRF-TOKEN'] = self._refresh_api_token(
+                            session, base_url, username, password, stale_token=used_token)
+                continue
+
+            return data
+
     @api.model
     def _handle_frequency_limit_error(self):
         """Обрабатывает ошибку 407 - приостанавливает задания на 30 минут"""
@@ -1037,27 +1969,29 @@ class SmartLoggerStation(models.Model):
 
         try:
             block_until = fields.Datetime.from_string(block_until_str)
-            if fields.Datetime.now() > block_until:
-                # Время блокировки истекло, восстанавливаем задания
-                cron_jobs = self.env['ir.cron'].search([('name', 'ilike', 'SmartLogger')])
-                for job in cron_jobs:
-                    was_active = IrConfigParameter.get_param(f'huawei.fusionsolar.cron_{job.id}_was_active')
-                    if was_active == 'true':
-                        job.write({'active': True})
-                        IrConfigParameter.set_param(f'huawei.fusionsolar.cron_{job.id}_was_active', '')
-
-                IrConfigParameter.set_param('huawei.fusionsolar.frequency_block_until', '')
-                _logger.info("Временная блокировка частоты API снята, cron задания восстановлены")
-                return True
-            else:
-                raise UserError(_("API тимчасово заблокований до %s через перевищення частоти запитів") % block_until)
-        except:
+        except (ValueError, TypeError):
+            # Пошкоджене значення параметра не блокує синхронізацію
+            return True
+
+        if fields.Datetime.now() > block_until:
+            # Время блокировки истекло, восстанавливаем задания
+            cron_jobs = self.env['ir.cron'].search([('name', 'ilike', 'SmartLogger')])
+            for job in cron_jobs:
+                was_active = IrConfigParameter.get_param(f'huawei.fusionsolar.cron_{job.id}_was_active')
+                if was_active == 'true':
+                    job.write({'active': True})
+                    IrConfigParameter.set_param(f'huawei.fusionsolar.cron_{job.id}_was_active', '')
+
+            IrConfigParameter.set_param('huawei.fusionsolar.frequency_block_until', '')
+            _logger.info("Временная блокировка частоты API снята, cron задания восстановлены")
             return True
 
+        raise UserError(_("API тимчасово заблокований до %s через перевищення частоти запитів") % block_until)
+
     def action_sync_data(self):
-        """Дія для ручної синхронізації даних через інтерфейс."""
+        """Дія для ручної синхронізації даних через інтерфейс (лише вибрані станції)."""
         try:
-            result = self.sync_fusionsolar_data()
+            result = self.sync_stations_kpi()
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -1080,31 +2014,102 @@ class SmartLoggerStation(models.Model):
 
     @api.model
     def cleanup_old_kpi_data(self, days_to_keep=90):
-        """Очищення старих KPI даних для економії місця."""
+        """Очищення старих KPI даних для економії місця.
+
+        Рядки видаляються порціями (cleanup_chunk_size) з фіксацією транзакції
+        після кожної порції, доки не вичерпано бюджет часу (cleanup_time_budget,
+        0 або менше - без обмеження). Найстаріші рядки видаляються першими, тому наступний запуск продовжує
+        з місця зупинки. Повертає кількість видалених записів.
+        """
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        chunk_size = max(1, int(IrConfigParameter.get_param('huawei.fusionsolar.cleanup_chunk_size', '5000')))
+        time_budget = float(IrConfigParameter.get_param('huawei.fusionsolar.cleanup_time_budget', '60'))
+
+        start_time = time.monotonic()
+        deadline = start_time + time_budget if time_budget > 0 else None
         cutoff_date = fields.Datetime.now() - timedelta(days=days_to_keep)
-        old_records = self.env['smartlogger.data'].search([
-            ('timestamp', '<', cutoff_date)
-        ])
 
-        count = len(old_records)
-        old_records.unlink()
-        _logger.info(f"Видалено {count} старих записів KPI (старіше {days_to_keep} днів)")
+        # Повністю прострочені місячні секції видаляються цілком (якщо таблиця секціонована)
+        count = self.env['smartlogger.data']._drop_expired_partitions(cutoff_date)
+        self._commit_progress()
+
+        # Дані пристроїв мають той самий термін зберігання, зведення KPI - власний
+        cleanup_plan = [
+            ('smartlogger_data', 'timestamp', cutoff_date),
+            ('smartlogger_device_data', 'timestamp', cutoff_date),
+        ]
+        # Сирі KPI - ступінчаста функція (skip_unchanged_samples): останній рядок
+        # станції до cutoff_date - її значення на початку терміну зберігання
+        keep_latest_tables = ('smartlogger_data',)
+        for model_name in ROLLUP_MODELS:
+            Rollup = self.env[model_name]
+            rollup_days = Rollup._get_retention_days()
+            if rollup_days > 0:
+                cleanup_plan.append((Rollup._table, 'period_start',
+                                     fields.Datetime.now() - timedelta(days=rollup_days)))
+
+        completed = True
+        for table, column, table_cutoff in cleanup_plan:
+            table_stats = self._cleanup_table_chunked(table, table_cutoff, chunk_size, deadline, column,
+                                                      keep_latest=table in keep_latest_tables)
+            count += table_stats['rows']
+            if not table_stats['completed']:
+                completed = False
+                break
+
+        seconds = time.monotonic() - start_time
+        _logger.info("Видалено %d старих записів KPI (старіше %d днів) за %.1f с (%.1f рядків/с)%s",
+                     count, days_to_keep, seconds, self._rows_per_second(count, seconds),
+                     '' if completed else '; бюджет часу вичерпано, продовження при наступному запуску')
 
         return count
 
     @api.model
-    def cleanup_old_kpi_data(self, days_to_keep=90):
-        """Очищення старих KPI даних для економії місця."""
-        cutoff_date = fields.Datetime.now() - timedelta(days=days_to_keep)
-        old_records = self.env['smartlogger.data'].search([
-            ('timestamp', '<', cutoff_date)
-        ])
+    def _cleanup_table_chunked(self, table, cutoff_date, chunk_size, deadline, column='timestamp',
+                               keep_latest=False):
+        """Видаляє рядки table, де column старший за cutoff_date, порціями по chunk_size.
 
-        count = len(old_records)
-        old_records.unlink()
-        _logger.info(f"Видалено {count} старих записів KPI (старіше {days_to_keep} днів)")
+        keep_latest - не видаляти останній рядок кожної станції до cutoff_date.
+        Кожна порція - окрема транзакція; робота зупиняється після
+        дедлайну (time.monotonic(), None - без обмеження). Повертає {'rows', 'completed'}.
+        """
+        keep_sql = ''
+        params = [cutoff_date]
+        if keep_latest:
+            keep_sql = f"""
+                          AND EXISTS (SELECT 1
+                                        FROM {table} n
+                                       WHERE n.station_id = k.station_id
+                                         AND n."{column}" > k."{column}"
+                                         AND n."{column}" < %s)"""
+            params.append(cutoff_date)
+        params.append(chunk_size)
+
+        deleted = 0
+        while deadline is None or time.monotonic() < deadline:
+            # (id, column) - ключ і для звичайної, і для секціонованої за column таблиці
+            self.env.cr.execute(f"""
+                DELETE FROM {table}
+                 WHERE (id, "{column}") IN (
+                       SELECT id, "{column}"
+                         FROM {table} k
+                        WHERE "{column}" < %s{keep_sql}
+                        ORDER BY "{column}"
+                        LIMIT %s)
+            """, params)
+            chunk_deleted = self.env.cr.rowcount
+            deleted += chunk_deleted
+            self._commit_progress()
+            if chunk_deleted < chunk_size:
+                return {'rows': deleted, 'completed': True}
+
+        return {'rows': deleted, 'completed': False}
 
-        return count
+    @api.model
+    def _commit_progress(self):
+        """Фіксує виконану частину довгої операції, щоб таймаут воркера не відкотив її."""
+        if not self.env.registry.in_test_mode():
+            self.env.cr.commit()
 
     @api.model
     def _monitor_station_health(self):
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_sync_job.py
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from datetime import timedelta
+import logging
+import os
+import socket
+import time
+
+from .smartlogger_sync_run import run_phase
+
+_logger = logging.getLogger(__name__)
+
+# Спільний для всіх воркерів слот частоти запитів: момент (epoch, с), з якого
+# наступний воркер може виконати запит пакету
+RATE_SLOT_PARAM = 'huawei.fusionsolar.sync_job_rate_slot'
+
+# Через скільки хвилин завдання "в роботі" вважається покинутим (воркер
+# зупинено limit_time_real або перезапуском) і може бути взяте повторно
+JOB_LEASE_MINUTES = 10
+
+# Максимальна затримка повтору невдалого завдання (секунди)
+MAX_RETRY_DELAY = 3600
+
+# Скільки днів зберігаються виконані та невдалі завдання
+FINISHED_JOB_RETENTION_DAYS = 2
+
+
+class SmartLoggerSyncJob(models.Model):
+    _name = 'smartlogger.sync.job'
+    _description = 'Завдання синхронізації пакету станцій SmartLogger'
+    _order = 'id DESC'
+
+    station_ids = fields.Many2many('smartlogger.station', 'smartlogger_sync_job_station_rel',
+                                   'job_id', 'station_id', string='Станції')
+    station_count = fields.Integer('Кількість станцій')
+    priority = fields.Integer('Пріоритет', default=10, help="Найвищий sync_priority станцій пакету (1 - першим).")
+    state = fields.Selection([
+        ('pending', 'Очікує'),
+        ('running', 'Виконується'),
+        ('done', 'Виконано'),
+        ('failed', 'Невдале'),
+    ], string='Стан', default='pending', required=True, index=True)
+    attempts = fields.Integer('Спроби', default=0)
+    next_attempt_at = fields.Datetime('Наступна спроба', default=fields.Datetime.now, required=True)
+    claimed_at = fields.Datetime('Взято в роботу')
+    worker = fields.Char('Воркер')
+    finished_at = fields.Datetime('Завершено')
+    rows_written = fields.Integer('Записано рядків')
+    last_error = fields.Text('Остання помилка')
+
+    def init(self):
+        """Індекс вибірки завдань воркерами: лише незавершені завдання."""
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS smartlogger_sync_job_claim_idx
+                ON smartlogger_sync_job (priority, next_attempt_at, id)
+             WHERE state IN ('pending', 'running')
+        """)
+
+    @api.model
+    def _is_queue_enabled(self):
+        """Чи розподіляти синхронізацію KPI між cron-воркерами через чергу завдань."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        return IrConfigParameter.get_param('huawei.fusionsolar.sync_job_queue', 'false') == 'true'
+
+    @api.model
+    def _get_queue_settings(self):
+        """Кількість спроб завдання, базова затримка повтору (с) та бюджет часу воркера (с)."""
+        IrConfigParameter = self.env['ir.config_parameter'].sudo()
+        max_attempts = max(1, int(IrConfigParameter.get_param('huawei.fusionsolar.sync_job_max_attempts', '5')))
+        retry_delay = max(0, int(IrConfigParameter.get_param('huawei.fusionsolar.sync_job_retry_delay', '60')))
+        time_budget = max(1, int(IrConfigParameter.get_param('huawei.fusionsolar.sync_worker_time_budget', '60')))
+        return max_attempts, retry_delay, time_budget
+
+    @api.model
+    def _enqueue_stations(self, batch_size, stations=None):
+        """Створює завдання на пакети станцій (без станцій, що вже стоять у черзі).
+
+        Повертає кількість створених завдань.
+        """
+        self._cleanup_finished_jobs()
+
+        self.env.cr.execute("""
+            SELECT r.station_id
+              FROM smartlogger_sync_job_station_rel r
+              JOIN smartlogger_sync_job j ON j.id = r.job_id
+             WHERE j.state IN ('pending', 'running')
+        """)
+        queued_ids = {row[0] for row in self.env.cr.fetchall()}
+
+        Station = self.env['smartlogger.station']
+        if stations is not None:
+            stations = stations.filtered(lambda s: s.id not in queued_ids)
+        batches = [
+            [station_id for station_id in batch if station_id not in queued_ids]
+            for batch in Station._plan_station_batches(batch_size, stations)
+        ]
+        batches = [batch for batch in batches if batch]
+
+        now = fields.Datetime.now()
+        jobs = self.create([{
+            'station_ids': [(6, 0, batch)],
+            'station_count': len(batch),
+            'priority': min(Station.browse(batch).mapped('sync_priority') or [10]),
+            'next_attempt_at': now,
+        } for batch in batches])
+
+        _logger.info("Черга синхронізації: створено %d завдань, %d станцій вже в черзі",
+                     len(jobs), len(queued_ids))
+        return len(jobs)
+
+    @api.model
+    def _get_queue_backlog(self, since):
+        """Незавершені завдання черги та завдання, що стали невдалими з моменту since.
+
+        Повертає {'jobs_pending', 'stations_pending', 'jobs_failed'}.
+        """
+        self.env.cr.execute("""
+            SELECT COUNT(*) FILTER (WHERE state IN ('pending', 'running')),
+                   COALESCE(SUM(station_count) FILTER (WHERE state IN ('pending', 'running')), 0),
+                   COUNT(*) FILTER (WHERE state = 'failed' AND finished_at >= %s)
+              FROM smartlogger_sync_job
+        """, [since])
+        jobs_pending, stations_pending, jobs_failed = self.env.cr.fetchone()
+        return {
+            'jobs_pending': jobs_pending,
+            'stations_pending': stations_pending,
+            'jobs_failed': jobs_failed,
+        }
+
+    @api.model
+    def _cleanup_finished_jobs(self):
+        """Видаляє старі виконані та невдалі завдання."""
+        cutoff = fields.Datetime.now() - timedelta(days=FINISHED_JOB_RETENTION_DAYS)
+        self.env.cr.execute("""
+            DELETE FROM smartlogger_sync_job
+             WHERE state IN ('done', 'failed')
+               AND finished_at < %s
+        """, [cutoff])
+
+    @api.model
+    def _claim_next_job(self, worker_name):
+        """Бере наступне завдання черги (FOR UPDATE SKIP LOCKED) та фіксує це.
+
+        Паралельні воркери пропускають рядки, заблоковані іншими, тому одне
+        завдання не береться двічі; після фіксації транзакції воно вже має
+        стан "виконується". Завдання, покинуте воркером довше за
+        JOB_LEASE_MINUTES, береться повторно.
+        """
+        now = fields.Datetime.now()
+        self.env.cr.execute("""
+            UPDATE smartlogger_sync_job j
+               SET state = 'running',
+                   attempts = j.attempts + 1,
+                   claimed_at = %s,
+                   worker = %s,
+                   write_uid = %s,
+                   write_date = %s
+             WHERE j.id = (SELECT id
+                             FROM smartlogger_sync_job
+                            WHERE (state = 'pending' AND next_attempt_at <= %s)
+                               OR (state = 'running' AND claimed_at < %s)
+                            ORDER BY priority, next_attempt_at, id
+                            LIMIT 1
+                              FOR UPDATE SKIP LOCKED)
+            RETURNING j.id
+        """, [now, worker_name, self.env.uid, now, now, now - timedelta(minutes=JOB_LEASE_MINUTES)])
+        row = self.env.cr.fetchone()
+        self.env['smartlogger.station']._commit_progress()
+        if not row:
+            return self.browse()
+        job = self.browse(row[0])
+        if hasattr(job, 'invalidate_recordset'):
+            job.invalidate_recordset()
+        else:
+            job.invalidate_cache(ids=job.ids)
+        return job
+
+    @api.model
+    def _acquire_rate_slot(self, interval):
+        """Чекає на спільний для всіх воркерів слот запиту (не частіше ніж раз на interval с).
+
+        Слот резервується атомарним upsert в окремій транзакції, тому
+        блокування рядка параметра утримується лише мить.
+        """
+        if interval <= 0:
+            return
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                INSERT INTO ir_config_parameter (key, value, create_uid, create_date, write_uid, write_date)
+                VALUES (%s, EXTRACT(EPOCH FROM clock_timestamp())::text, %s,
+                        now() AT TIME ZONE 'UTC', %s, now() AT TIME ZONE 'UTC')
+                ON CONFLICT (key) DO UPDATE
+                   SET value = GREATEST(EXTRACT(EPOCH FROM clock_timestamp()),
+                                        COALESCE(NULLIF(ir_config_parameter.value, ''), '0')::float8 + %s)::text,
+                       write_date = EXCLUDED.write_date
+                RETURNING value::float8 - EXTRACT(EPOCH FROM clock_timestamp())
+            """, [RATE_SLOT_PARAM, self.env.uid, self.env.uid, interval])
+            wait = cr.fetchone()[0]
+        if wait > 0:
+            time.sleep(wait)
+
+    @api.model
+    def run_worker(self):
+        """Воркер черги (cron): бере та виконує завдання, доки є час і завдання.
+
+        Кожне завдання фіксується окремо, тож кілька cron-воркерів обробляють
+        чергу паралельно, а помилка одного пакету не відкочує інші.
+        """
+        stats = {'jobs': 0, 'retried': 0, 'failed': 0, 'rows': 0}
+        if not self._is_queue_enabled():
+            # Черга вимкнена (sync_job_queue) - без запиту вибірки та запису в журнал
+            return stats
+
+        Station = self.env['smartlogger.station']
+        try:
+            Station._check_api_blocked_status()
+            Station._check_frequency_block()
+        except UserError as e:
+            _logger.warning("Воркер черги синхронізації пропущено: %s", str(e))
+            return stats
+
+        max_attempts, retry_delay, time_budget = self._get_queue_settings()
+        deadline = time.monotonic() + time_budget
+        worker_name = f"{socket.gethostname()}:{os.getpid()}"
+
+        # Запуск воркера поза плановою синхронізацією - окремий запис журналу запусків
+        with self.env['smartlogger.sync.run']._track('worker') as run_stats, run_phase('kpi_batches'):
+            session = None
+            base_url = request_delay = None
+            try:
+                while time.monotonic() < deadline:
+                    job = self._claim_next_job(worker_name)
+                    if not job:
+                        break
+
+                    stats['jobs'] += 1
+                    try:
+                        # Сесія відкривається в межах завдання: помилка облікових даних
+                        # чи входу повертає його в чергу, а не лишає "в роботі"
+                        if session is None:
+                            base_url, username, password, batch_size, request_delay = \
+                                Station._get_fusionsolar_api_credentials()
+                            session = Station._open_api_session(base_url, username, password)
+                        with self.env.cr.savepoint():
+                            rows = job._execute(session, base_url, request_delay, max_attempts)
+                        job._mark_done(rows)
+                        stats['rows'] += rows
+                    except Exception as e:
+                        # Savepoint відкотив записи пакету - кеш ORM теж скидається
+                        if hasattr(self.env, 'invalidate_all'):
+                            self.env.invalidate_all()
+                        else:
+                            self.invalidate_cache()
+                        _logger.warning("Завдання синхронізації %d (спроба %d) не вдалося: %s",
+                                        job.id, job.attempts, str(e))
+                        if job._schedule_retry(str(e), max_attempts, retry_delay):
+                            stats['retried'] += 1
+                        else:
+                            stats['failed'] += 1
+                        if session is None:
+                            # Без сесії наступні завдання теж не виконати
+                            Station._commit_progress()
+                            break
+                    Station._commit_progress()
+            finally:
+                if session:
+                    Station._close_api_session(session)
+
+            if not stats['jobs']:
+                # Порожня черга - не засмічувати журнал запусків
+                run_stats.discard()
+            elif not stats['failed']:
+                # Воркер, що вичерпав чергу, завершує синхронізацію
+                backlog = self._get_queue_backlog(since=run_stats.started_at)
+                if not backlog['jobs_pending'] and not backlog['jobs_failed']:
+                    Station._mark_sync_successful()
+                    Station._commit_progress()
+
+        if stats['jobs']:
+            _logger.info("Воркер черги %s: завдань %d, повторів %d, невдалих %d, рядків %d",
+                         worker_name, stats['jobs'], stats['retried'], stats['failed'], stats['rows'])
+        return stats
+
+    def _execute(self, session, base_url, request_delay, max_attempts):
+        """Синхронізує KPI станцій завдання; повертає кількість записаних рядків.
+
+        Невдалий пакетний запит піднімає помилку (повтор із затримкою),
+        а на останній спробі станції обробляються поодинці, як і без черги
+        (крім відповіді про перевищення частоти - тоді завдання стає невдалим).
+        """
+        self.ensure_one()
+        Station = self.env['smartlogger.station']
+        stations = self.station_ids.exists()
+        if not stations:
+            return 0
+
+        # Пейсер - рівня процесу, тому спільний слот воркерів резервується з його
+        # вивченою швидкістю: після відповіді про перевищення частоти воркер
+        # відступає й для інших процесів
+        pacer = Station._get_api_pacer('getStationRealKpi')
+        self._acquire_rate_slot(1.0 / pacer.rate if pacer.rate > 0 else request_delay)
+        kpi_data = Station._fetch_batch_kpi(session, base_url, stations.mapped('station_code'))
+        if not (kpi_data and kpi_data.get('success')) and self.attempts < max_attempts:
+            raise UserError(_("getStationRealKpi не вдався: failCode=%s")
+                            % (kpi_data.get('failCode') if kpi_data else _('Немає відповіді')))
+
+        batch_stats = Station._process_stations_batch(session, base_url, stations, kpi_data=kpi_data)
+        if batch_stats.get('throttled'):
+            # Без запитів окремих станцій: завдання повторюється (або стає невдалим)
+            raise UserError(_("getStationRealKpi обмежено за частотою: failCode=%s") % kpi_data.get('failCode'))
+        return batch_stats['rows']
+
+    def _mark_done(self, rows):
+        """Позначає завдання виконаним."""
+        self.ensure_one()
+        self.write({
+            'state': 'done',
+            'finished_at': fields.Datetime.now(),
+            'rows_written': rows,
+            'last_error': False,
+        })
+
+    def _schedule_retry(self, error, max_attempts, retry_delay):
+        """Повертає завдання в чергу з експоненційною затримкою; False - спроби вичерпано."""
+        self.ensure_one()
+        if self.attempts >= max_attempts:
+            self.write({'state': 'failed', 'finished_at': fields.Datetime.now(), 'last_error': error})
+            return False
+        delay = min(retry_delay * 2 ** (self.attempts - 1), MAX_RETRY_DELAY)
+        self.write({
+            'state': 'pending',
+            'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+            'last_error': error,
+        })
+        return True
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# ФАЙЛ: models/smartlogger_sync_run.py
+
+from odoo import models, fields, api
+from contextlib import contextmanager
+from datetime import timedelta
+import json
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+# Етапи запуску синхронізації -> поле тривалості в журналі
+RUN_PHASES = {
+    'login': 'login_seconds',
+    'station_list': 'station_list_seconds',
+    'kpi_batches': 'kpi_seconds',
+    'device_fallback': 'device_seconds',
+    'db_write': 'db_write_seconds',
+}
+
+# Лічильники запуску (однойменні поля журналу)
+RUN_COUNTERS = ('stations_found', 'stations_created', 'stations_updated', 'stations_processed',
+                'stations_skipped', 'rows_written', 'samples_unchanged')
+
+# Скільки днів зберігаються записи журналу запусків
+SYNC_RUN_RETENTION_DAYS = 90
+
+# Статистика активного запуску поточного потоку (потоки пулу запитів
+# KPI отримують її явно, див. activate_run_stats)
+_active = threading.local()
+
+
+class SyncRunStats(object):
+    """Накопичувач статистики одного запуску синхронізації (безпечний для потоків)."""
+
+    def __init__(self):
+        self.started_at = fields.Datetime.now()
+        self.start = time.monotonic()
+        self.phase_seconds = dict.fromkeys(RUN_PHASES, 0.0)
+        self.api_calls = {}
+        self.fail_codes = {}
+        self.counters = dict.fromkeys(RUN_COUNTERS, 0)
+        self.state = 'done'
+        self.error = None
+        self.recorded = True
+        self._open_phases = dict.fromkeys(RUN_PHASES, 0)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """Вимірює тривалість етапу; вкладений виклик того ж етапу не рахується двічі."""
+        with self._lock:
+            self._open_phases[name] += 1
+            outermost = self._open_phases[name] == 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._open_phases[name] -= 1
+                if outermost:
+                    self.phase_seconds[name] += time.monotonic() - start
+
+    def add_seconds(self, name, seconds):
+        """Додає вже виміряну тривалість до етапу."""
+        with self._lock:
+            self.phase_seconds[name] += seconds
+
+    def count_call(self, endpoint, data=None):
+        """Рахує API виклик ендпоінта та failCode невдалої відповіді."""
+        with self._lock:
+            self.api_calls[endpoint] = self.api_calls.get(endpoint, 0) + 1
+            if isinstance(data, dict) and not data.get('success') and data.get('failCode') is not None:
+                code = str(data.get('failCode'))
+                self.fail_codes[code] = self.fail_codes.get(code, 0) + 1
+
+    def add(self, counter, value):
+        """Додає value до лічильника запуску."""
+        with self._lock:
+            self.counters[counter] += value or 0
+
+    def total_calls(self):
+        """Загальна кількість API викликів запуску."""
+        return sum(self.api_calls.values())
+
+    def discard(self):
+        """Не записувати цей запуск у журнал (напр. воркер з порожньою чергою)."""
+        self.recorded = False
+
+    def result_values(self):
+        """Статистика для результату синхронізації (майстер синхронізації)."""
+        with self._lock:
+            values = dict(self.counters)
+            values['api_calls_made'] = sum(self.api_calls.values())
+            values['api_calls_by_endpoint'] = dict(self.api_calls)
+        return values
+
+
+def get_active_run_stats():
+    """Статистика запуску, що виконується в цьому потоці (або None)."""
+    return getattr(_active, 'stats', None)
+
+
+@contextmanager
+def activate_run_stats(stats):
+    """Робить stats активною статистикою потоку (для потоків пулу запитів)."""
+    previous = get_active_run_stats()
+    _active.stats = stats
+    try:
+        yield stats
+    finally:
+        _active.stats = previous
+
+
+@contextmanager
+def run_phase(name):
+    """Етап активного запуску; без активного запуску нічого не вимірює."""
+    stats = get_active_run_stats()
+    if stats is None:
+        yield
+        return
+    with stats.phase(name):
+        yield
+
+
+class SmartLoggerSyncRun(models.Model):
+    _name = 'smartlogger.sync.run'
+    _description = 'Журнал запусків синхронізації SmartLogger'
+    _order = 'started_at DESC'
+    _rec_name = 'started_at'
+
+    started_at = fields.Datetime('Початок', required=True, index=True)
+    finished_at = fields.Datetime('Завершення')
+    duration = fields.Float('Тривалість (с)', digits=(16, 2))
+    run_type = fields.Selection([
+        ('full', 'Планова синхронізація'),
+        ('selected', 'Вибрані станції'),
+        ('worker', 'Воркер черги'),
+    ], string='Тип запуску', required=True)
+    state = fields.Selection([
+        ('done', 'Завершено'),
+        ('interrupted', 'Призупинено'),
+        ('failed', 'Помилка'),
+    ], string='Стан', required=True)
+    error = fields.Text('Помилка')
+
+    # Тривалість етапів: запис у БД входить до пакетів KPI, а логін і
+    # запити пристроїв - до етапів, під час яких вони відбулися
+    login_seconds = fields.Float('Логін (с)', digits=(16, 2))
+    station_list_seconds = fields.Float('Список станцій (с)', digits=(16, 2))
+    kpi_seconds = fields.Float('Пакети KPI (с)', digits=(16, 2))
+    device_seconds = fields.Float('Запити пристроїв (с)', digits=(16, 2))
+    db_write_seconds = fields.Float('Запис у БД (с)', digits=(16, 2))
+
+    api_calls = fields.Integer('API викликів')
+    api_calls_by_endpoint = fields.Text('API виклики за ендпоінтами (JSON)')
+    fail_count = fields.Integer('Невдалих відповідей')
+    fail_codes = fields.Text('failCode (JSON)')
+
+    stations_found = fields.Integer('Станцій знайдено в API')
+    stations_created = fields.Integer('Станцій створено')
+    stations_updated = fields.Integer('Станцій оновлено')
+    stations_processed = fields.Integer('Станцій синхронізовано')
+    stations_skipped = fields.Integer('Станцій пропущено', help="Не вибрані планувальником (ніч, бюджет запитів).")
+    rows_written = fields.Integer('Записано рядків KPI')
+    samples_unchanged = fields.Integer('Незмінених вимірів', help="Виміри без змін, для яких рядок історії не створено.")
+
+    @api.model
+    @contextmanager
+    def _track(self, run_type):
+        """Записує запуск у журнал після його завершення (зокрема невдалого).
+
+        Вкладений запуск (напр. воркер черги всередині планової
+        синхронізації) доповнює статистику зовнішнього, а не створює
+        окремий запис.
+        """
+        stats = get_active_run_stats()
+        if stats is not None:
+            # discard() вкладеного запуску не скасовує запис зовнішнього
+            recorded = stats.recorded
+            try:
+                yield stats
+            finally:
+                stats.recorded = recorded
+            return
+
+        stats = SyncRunStats()
+        with activate_run_stats(stats):
+            try:
+                yield stats
+            except Exception as e:
+                stats.state = 'failed'
+                stats.error = str(e)
+                raise
+            finally:
+                if stats.recorded:
+                    self._record(run_type, stats)
+
+    @api.model
+    def _record(self, run_type, stats):
+        """Зберігає запис журналу в окремій транзакції: він лишається і після відкату запуску."""
+        values = {
+            'started_at': stats.started_at,
+            'finished_at': fields.Datetime.now(),
+            'duration': time.monotonic() - stats.start,
+            'run_type': run_type,
+            'state': stats.state,
+            'error': stats.error,
+            'api_calls': stats.total_calls(),
+            'api_calls_by_endpoint': json.dumps(stats.api_calls, sort_keys=True),
+            'fail_count': sum(stats.fail_codes.values()),
+            'fail_codes': json.dumps(stats.fail_codes, sort_keys=True) if stats.fail_codes else False,
+        }
+        values.update({field_name: stats.phase_seconds[phase] for phase, field_name in RUN_PHASES.items()})
+        values.update(stats.counters)
+        try:
+            with self.env.registry.cursor() as cr:
+                SyncRun = self.with_env(self.env(cr=cr))
+                SyncRun.create(values)
+                cr.execute("DELETE FROM smartlogger_sync_run WHERE started_at < %s",
+                           [fields.Datetime.now() - timedelta(days=SYNC_RUN_RETENTION_DAYS)])
+        except Exception as e:
+            _logger.warning("Не вдалося записати запуск синхронізації в журнал: %s", str(e))
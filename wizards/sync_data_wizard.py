@@ -273,15 +273,16 @@ class SyncDataWizard(models.TransientModel):
             base_url, username, password, batch_size, request_delay = stations_model._get_fusionsolar_api_credentials()
 
             # Викликаємо тільки оновлення списку станцій
-            stations_model._update_station_list(base_url, username, password, request_delay)
-
-            new_count = len(stations_model.search([('create_date', '>=', datetime.now() - timedelta(minutes=5))]))
+            stats = stations_model._update_station_list(base_url, username, password)
 
             return {
                 'success': True,
                 'message': _("Список станцій оновлено"),
-                'stations_created': new_count,
-                'stations_processed': len(stations_model.search([]))
+                'stations_found': stats['stations_found'],
+                'stations_created': stats['stations_created'],
+                'stations_updated': stats['stations_updated'],
+                'api_calls_made': stats['api_calls'],
+                'stations_processed': stations_model.search_count([])
             }
 
         except Exception as e:
@@ -289,10 +290,10 @@ class SyncDataWizard(models.TransientModel):
             raise
 
     def _perform_data_only_sync(self):
-        """Оновлює тільки KPI дані існуючих станцій."""
+        """Оновлює тільки KPI дані існуючих (або вибраних) станцій."""
         stations_model = self.env['smartlogger.station']
 
-        existing_stations = stations_model.search([])
+        existing_stations = self.selected_station_ids or stations_model.search([])
         if not existing_stations:
             raise UserError(_("Немає станцій для оновлення даних. Спочатку виконайте синхронізацію списку станцій."))
 
@@ -305,22 +306,12 @@ class SyncDataWizard(models.TransientModel):
         return self._sync_station_batch(self.selected_station_ids)
 
     def _sync_station_batch(self, stations):
-        """Синхронізує пакет станцій."""
+        """Синхронізує KPI лише переданих станцій."""
         if not stations:
             return {'success': True, 'stations_processed': 0}
 
         try:
-            stations_model = self.env['smartlogger.station']
-            base_url, username, password, batch_size, request_delay = stations_model._get_fusionsolar_api_credentials()
-
-            # Використовуємо метод пакетної синхронізації
-            stations_model._sync_stations_batch(base_url, username, password, batch_size, request_delay)
-
-            return {
-                'success': True,
-                'message': _("Пакетна синхронізація завершена"),
-                'stations_processed': len(stations)
-            }
+            return stations.sync_stations_kpi()
 
         except Exception as e:
             _logger.error("Помилка пакетної синхронізації: %s", e)
@@ -375,6 +366,10 @@ class SyncDataWizard(models.TransientModel):
             details.append(f"Станцій оновлено: {result['stations_updated']}")
         if result.get('api_calls_made'):
             details.append(f"API викликів зроблено: {result['api_calls_made']}")
+            for endpoint, calls in sorted((result.get('api_calls_by_endpoint') or {}).items()):
+                details.append(f"  {endpoint}: {calls}")
+        if result.get('rows_written'):
+            details.append(f"Записано рядків KPI: {result['rows_written']}")
 
         return "\n".join(details)
 